@@ -1,3 +1,5 @@
 from .controller import NoneJsonError, Control
-from .helpers import default_settings, get_palette, get_intervals_from_string
+from .helpers import (default_settings, get_app_data_path, get_palette,
+                      get_intervals_from_string, set_logging,
+                      update_main_settings)
 from .interface_data import get_actions_list, get_menu_dict, get_toolbar_list
\ No newline at end of file
@@ -1,10 +1,12 @@
 from collections import defaultdict
+from copy import copy
 
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-from app.model import FlightMap, Mathematical, file_methods
+from app.model import (FlightMap, LazyTable, Mathematical, PddCache,
+                       Session, SessionJournal, file_methods)
 
 from .helpers import get_intervals_from_string
 
@@ -18,15 +20,26 @@ class Control(object):
     Класс контроллера для связи модели и интерфейса.
     data - данные полёта.
     data_calculated - признак были ли данные расчитаны или нет.
+    journal - журнал изменений данных для восстановления после сбоя.
     '''
 
     needed_usred_diss, needed_usred_kbti, needed_usred_pnk = (
         False, False, False
     )
+    # методы, вызовы которых записываются в журнал и повторяются из него
+    journaled = (
+        'load_text', 'load_gzip', 'load_pdd', 'load_pdd_batch',
+        'load_pdd_interval', 'set_calculate_data_pnk', 'concatenate_unch',
+        'shift_time', 'change_column_name', 'delete_item', 'add_column',
+        'set_flight_data'
+    )
 
     def __init__(self) -> None:
         self.data: dict = {}
         self.data_calculated: bool = False
+        # последний открытый pdd файл для режима слежения
+        self.follow_info: dict | None = None
+        self.journal: SessionJournal | None = None
 
     def load_text(
         self,
@@ -35,45 +48,120 @@ class Control(object):
         adr: str,
         type: str,
         category_info: dict,
-        load_unknown: bool = True
+        load_unknown: bool = True,
+        workers: int = 1,
+        progress=None,
+        cancel=None
     ) -> None:
         '''
         Загрузка данных из txt формата.
+        Если неизвестные элементы не загружаются, разбираются только
+        столбцы АДР из описателя.
+        workers - число потоков разбора больших файлов.
+        progress, cancel - функции хода и прерывания чтения
+        (см. file_methods.read_text).
         '''
-        if type == 'txt':
-            data_from_file = file_methods.load_txt(filepath)
-        else:
-            data_from_file = file_methods.load_csv(filepath)
-        if 'name' in data_from_file.columns:
-            data_from_file = data_from_file.rename(columns={'name': 'time'})
+        data_from_file = self.read_text(
+            filepath, adr, type, category_info, load_unknown, workers,
+            progress, cancel
+        )
+        self.set_text_data(
+            filepath, category, adr, type, category_info, load_unknown,
+            data_from_file
+        )
 
+    @staticmethod
+    def read_text(
+        filepath: str,
+        adr: str,
+        type: str,
+        category_info: dict,
+        load_unknown: bool = True,
+        workers: int = 1,
+        progress=None,
+        cancel=None
+    ) -> DataFrame:
+        '''
+        Разбор txt или csv файла без изменения данных контроллера,
+        чтобы он шёл в отдельном потоке.
+        '''
+        usecols, dtype = None, None
         if not load_unknown:
-            category_headers = []
             for elem in category_info:
                 if elem['adr_name'] == adr:
-                    category_headers = [field['name']
-                                        for field in elem['fields']]
-                    category_headers.extend(['time', 'latitude', 'longitude'])
+                    usecols, dtype = file_methods.get_text_schema(elem)
                     break
-            if not category_headers:
+            if usecols is None:
                 raise ValueError('Не найдены заголовки в json файле')
-            for column_name in data_from_file:
-                if column_name not in category_headers:
-                    del data_from_file[column_name]
+        load = file_methods.load_txt if type == 'txt' else file_methods.load_csv
+        data_from_file = load(
+            filepath, usecols, dtype, workers, progress, cancel
+        )
+        if 'name' in data_from_file.columns:
+            data_from_file = data_from_file.rename(columns={'name': 'time'})
+        return data_from_file
 
+    def set_text_data(
+        self,
+        filepath: str,
+        category: str,
+        adr: str,
+        type: str,
+        category_info: dict,
+        load_unknown: bool,
+        data_from_file: DataFrame
+    ) -> None:
+        '''
+        Добавление АДР, разобранного read_text, в категорию.
+        '''
         self.data[category] = {adr: data_from_file}
         self.data_calculated = self._check_calculated()
+        self.log(
+            'load_text', filepath=filepath, category=category, adr=adr,
+            type=type, category_info=category_info, load_unknown=load_unknown
+        )
+
+    def load_gzip(self, filepath: str, workers: int = 1) -> None:
+        '''
+        Загрузка данных из файла сеанса.
+        workers - число потоков распаковки столбцов.
+        Файл, открытый без других данных, становится контрольной точкой
+        журнала изменений.
+        '''
+        self.set_gzip_data(filepath, self.read_gzip(filepath, workers))
 
-    def load_gzip(self, filepath: str) -> None:
+    @staticmethod
+    def read_gzip(filepath: str, workers: int = 1) -> dict:
         '''
-        Загрузка данных из pickle gzip формата.
+        Чтение файла сеанса без изменения данных контроллера, чтобы
+        долгое чтение файла прежнего формата шло в отдельном потоке.
+        Из файла сеанса читается только каталог.
         '''
-        data_from_file = file_methods.load_gzip(filepath)
+        data_from_file = file_methods.load_gzip(filepath, workers)
         if not isinstance(data_from_file, dict):
             raise TypeError('Неверный тип данных в gzip файле')
+        return data_from_file
+
+    @staticmethod
+    def is_lazy_gzip(filepath: str) -> bool:
+        '''
+        Файл сеанса открывается по каталогу без чтения столбцов,
+        файл прежнего формата (pickle в gzip) читается целиком.
+        '''
+        return Session.is_session(filepath)
+
+    def set_gzip_data(self, filepath: str, data_from_file: dict) -> None:
+        '''
+        Добавление данных, прочитанных из файла сеанса filepath.
+        '''
+        checkpoint = self.data_is_none()
         for category in data_from_file:
             self.data[category] = data_from_file[category]
         self.data_calculated = self._check_calculated()
+        if checkpoint:
+            self.set_checkpoint(filepath)
+        else:
+            self.log('load_gzip', filepath=filepath)
 
     @staticmethod
     def load_pytnon_script(filepath: str) -> str:
@@ -91,14 +179,183 @@ class Control(object):
         data_for_settings = file_methods.load_json(filepath)
         return data_for_settings
 
-    def load_pdd(self, filepath: str, category, json_data) -> None:
+    def load_pdd(
+        self,
+        filepath: str,
+        category,
+        json_data,
+        workers: int = 1,
+        cache_dir: str = '',
+        cache_size: int = 0
+    ) -> dict:
         '''
         Загрузка данных из pdd формата.
+        workers - число потоков распаковки.
+        cache_dir, cache_size - папка и размер (МБ) дискового кэша
+        распакованных данных, при нулевом размере кэш не используется.
+        Возвращает отчёт распаковки (см. file_methods.get_decode_report).
         '''
         # TODO добавить проверку json_data
 
-        data_from_file = file_methods.load_pdd(filepath, json_data)
+        report = {}
+        data_from_file = file_methods.load_pdd(
+            filepath,
+            json_data,
+            workers,
+            report,
+            self.get_pdd_cache(cache_dir, cache_size)
+        )
         self.data[category] = data_from_file
+        self.follow_info = {
+            'filepath': filepath,
+            'category': category,
+            'offset': report['offset']
+        }
+        # записи, дописанные при слежении, повторно читаются из файла
+        self.log(
+            'load_pdd', filepath=filepath, category=category,
+            json_data=json_data
+        )
+        return report
+
+    def load_pdd_batch(
+        self,
+        filepaths: list,
+        category,
+        json_data,
+        workers: int = 1,
+        cache_dir: str = '',
+        cache_size: int = 0,
+        progress=None,
+        cancel=None
+    ) -> dict:
+        '''
+        Загрузка нескольких pdd файлов одного полёта в одну категорию.
+        Вместо списка можно передать путь к папке с pdd файлами.
+        progress - функция progress(filepath, done, total),
+        cancel - функция прерывания загрузки (см. file_methods.load_pdd_batch).
+        Возвращает отчёт загрузки по файлам (files, skipped,
+        discontinuities).
+        '''
+        tables, report = self.read_pdd_batch(
+            filepaths, json_data, workers, cache_dir, cache_size,
+            progress, cancel
+        )
+        self.set_pdd_batch(filepaths, category, json_data, tables)
+        return report
+
+    @classmethod
+    def read_pdd_batch(
+        cls,
+        filepaths: list,
+        json_data,
+        workers: int = 1,
+        cache_dir: str = '',
+        cache_size: int = 0,
+        progress=None,
+        cancel=None
+    ) -> tuple:
+        '''
+        Распаковка нескольких pdd файлов без изменения данных контроллера,
+        чтобы она шла в отдельном потоке.
+        Возвращает таблицы АДР и отчёт загрузки.
+        '''
+        if isinstance(filepaths, str):
+            filepaths = file_methods.get_pdd_files(filepaths)
+        if not filepaths:
+            raise ValueError('Не найдены pdd файлы')
+        report = {}
+        tables = file_methods.load_pdd_batch(
+            filepaths,
+            json_data,
+            workers,
+            report,
+            cls.get_pdd_cache(cache_dir, cache_size),
+            progress,
+            cancel
+        )
+        return tables, report
+
+    def set_pdd_batch(
+        self,
+        filepaths: list,
+        category,
+        json_data,
+        tables: dict
+    ) -> None:
+        '''
+        Добавление таблиц, распакованных read_pdd_batch, в категорию.
+        '''
+        self.data[category] = tables
+        # объединённые файлы не дописываются при слежении
+        self.follow_info = None
+        self.log(
+            'load_pdd_batch', filepaths=filepaths, category=category,
+            json_data=json_data
+        )
+
+    @staticmethod
+    def get_pdd_report_text(report: dict) -> str:
+        '''
+        Текст отчёта распаковки pdd файла.
+        '''
+        return file_methods.get_decode_report_text(report)
+
+    @staticmethod
+    def get_pdd_cache(cache_dir: str, cache_size: int) -> PddCache | None:
+        '''
+        Дисковый кэш распакованных данных, при нулевом размере (МБ)
+        кэш не используется.
+        '''
+        if cache_dir and cache_size > 0:
+            return PddCache(cache_dir, cache_size * 2 ** 20)
+        return None
+
+    def load_pdd_interval(
+        self,
+        filepath: str,
+        category,
+        json_data,
+        start: float,
+        stop: float
+    ) -> None:
+        '''
+        Загрузка из pdd формата только записей со временем
+        от start до stop по индексу файла.
+        '''
+        self.data[category] = file_methods.load_pdd_interval(
+            filepath, json_data, start, stop
+        )
+        # интервал не дописывается при слежении за файлом
+        self.follow_info = None
+        self.log(
+            'load_pdd_interval', filepath=filepath, category=category,
+            json_data=json_data, start=float(start), stop=float(stop)
+        )
+
+    def can_follow_pdd(self) -> bool:
+        '''
+        Проверка, есть ли открытый pdd файл для слежения.
+        '''
+        return (
+            self.follow_info is not None
+            and self.follow_info['category'] in self.data
+        )
+
+    def update_pdd(self) -> dict:
+        '''
+        Дописывание записей, появившихся в отслеживаемом pdd файле.
+        Возвращает словарь {имя АДР: число новых записей}.
+        '''
+        if not self.can_follow_pdd():
+            return {}
+        offset, counts = file_methods.append_pdd(
+            self.follow_info['filepath'],
+            self.data[self.follow_info['category']],
+            self.follow_info['offset']
+        )
+        self.follow_info['offset'] = offset
+        return counts
 
     @staticmethod
     def save_python_sript(filepath: str, data: DataFrame) -> None:
@@ -114,6 +371,28 @@ class Control(object):
         '''
         file_methods.save_json(filepath, data)
 
+    @staticmethod
+    def get_memory_sizes(data) -> dict:
+        '''
+        Размер столбцов таблицы в памяти (байт) без загрузки ленивых
+        столбцов, None - размер ещё не известен.
+        '''
+        if isinstance(data, LazyTable):
+            return {name: data.get_nbytes(name) for name in data.columns}
+        return {
+            name: int(size)
+            for name, size in data.memory_usage(index=False).items()
+        }
+
+    @staticmethod
+    def get_time_scale(data) -> float | None:
+        '''
+        Длительность тика времени данных, если время хранится тиками.
+        '''
+        if isinstance(data, LazyTable):
+            return data.get_scale('time')
+        return None
+
     def set_calculate_data_pnk(
         self,
         category: str,
@@ -139,7 +418,10 @@ class Control(object):
             not_found_headers = set(need_headers) - set(headers)
             raise ValueError(
                 f'В данных не хватает: {", ".join(not_found_headers)}')
-        self.worker = Mathematical(self.data[category][adr].copy())
+        data = self.data[category][adr]
+        self.worker = Mathematical(
+            data[sorted(need_headers)], self.get_time_scale(data)
+        )
         self.worker.apply_coefficient_w_diss(
             wx=corrections['koef_Wx_PNK'],
             wz=corrections['koef_Wz_PNK'],
@@ -160,6 +442,11 @@ class Control(object):
                 target_adr: self.worker.get_only_calculated_data_pnk()
             }
         self.data_calculated = True
+        self.log(
+            'set_calculate_data_pnk', category=category, adr=adr,
+            plane_correct=plane_correct, corrections=corrections,
+            target_adr=target_adr
+        )
 
     def save_report(
         self,
@@ -186,7 +473,10 @@ class Control(object):
         category_calc = categories['calc']['category']
         adr_calc = categories['calc']['adr']
         data_calc = self.data[category_calc][adr_calc]
-        self.worker = Mathematical(data_source.merge(data_calc, on='time'))
+        self.worker = Mathematical(
+            data_source.merge(data_calc, on='time'),
+            self.get_time_scale(data_source)
+        )
         if string == '':
             if 'JVD_H' in data_source.columns:
                 intervals = self.worker.get_intervals(koef_for_intervals)
@@ -249,13 +539,135 @@ class Control(object):
             data_for_csv = self.data[category][adr]
         file_methods.write_csv(data_for_csv, filepath)
 
-    def save_gzip(self, filepath: str) -> None:
+    def save_gzip(
+        self,
+        filepath: str,
+        codec: str | None = None,
+        level: int | None = None,
+        workers: int = 1
+    ) -> None:
         '''
-        Сохранение данных в формате pickle gzip.
+        Сохранение данных в файл сеанса.
+        codec, level - способ и уровень сжатия столбцов (zlib, lzma, bz2),
+        workers - число потоков сжатия.
+        Сохранённый файл становится контрольной точкой журнала изменений.
         '''
         if self.data_is_none():
             raise Exception('Нет загруженных данных')
-        file_methods.write_gzip(self.data, filepath)
+        file_methods.write_gzip(self.data, filepath, codec, level, workers)
+        self.set_checkpoint(filepath)
+
+    def shift_time(self, category: str, adr: str, value: float) -> None:
+        '''
+        Смещение времени АДР на value секунд.
+        '''
+        data = self.data[category][adr]
+        data['time'] = data['time'] + value
+        self.log('shift_time', category=category, adr=adr, value=float(value))
+
+    def add_column(
+        self,
+        category: str,
+        adr: str,
+        name: str,
+        time,
+        values
+    ) -> str:
+        '''
+        Добавление столбца name со значениями values по времени time.
+        Новые категория и АДР создаются, в существующий АДР столбец
+        добавляется объединением по времени, при совпадении имени
+        к нему дописывается 1. Если время совпадает со временем АДР,
+        столбец добавляется без объединения, ленивая таблица остаётся
+        ленивой.
+        Возвращает имя добавленного столбца.
+        '''
+        time, values = np.asarray(time), np.asarray(values)
+        column = name
+        if category not in self.data:
+            self.data[category] = {adr: DataFrame({'time': time, column: values})}
+        elif adr not in self.data[category]:
+            self.data[category][adr] = DataFrame({'time': time, column: values})
+        else:
+            data = self.data[category][adr]
+            while column in data.columns:
+                column += '1'
+            if isinstance(data, LazyTable):
+                data_time = data.column('time')
+            else:
+                data_time = data['time'].to_numpy()
+            if np.array_equal(data_time, time):
+                data = copy(data)
+                data[column] = values
+                self.data[category][adr] = data
+            else:
+                new_data = DataFrame({'time': time, column: values})
+                new_data['time'] = new_data['time'].astype(data_time.dtype)
+                self.data[category][adr] = data.merge(
+                    new_data, on='time', how='outer'
+                )
+        self.log(
+            'add_column', category=category, adr=adr, name=name,
+            time=time, values=values
+        )
+        return column
+
+    def set_flight_data(self, flight_data: dict) -> None:
+        '''
+        Установка сведений о полёте.
+        '''
+        self.data[Session.flight_data] = flight_data
+        self.log('set_flight_data', flight_data=flight_data)
+
+    def open_journal(self, filepath: str, workers: int = 1) -> dict:
+        '''
+        Открытие журнала изменений filepath.
+        Если в журнале есть изменения (программа не была закрыта
+        штатно), данные восстанавливаются: загружается контрольная точка
+        и по порядку повторяются вызовы из журнала, workers - число
+        потоков распаковки столбцов.
+        Возвращает отчёт {entries: число изменений, errors: ошибки
+        повтора}. Если контрольная точка изменена, журнал начинается
+        заново и вызывается ValueError.
+        '''
+        journal = SessionJournal(filepath)
+        try:
+            checkpoint, entries = journal.open()
+        except ValueError:
+            journal.reset()
+            self.journal = journal
+            raise
+        report = {'entries': len(entries), 'errors': []}
+        if entries and checkpoint is not None:
+            self.load_gzip(checkpoint, workers)
+        for method, args in entries:
+            try:
+                if method not in self.journaled:
+                    raise ValueError(f'Неизвестное изменение: {method}')
+                getattr(self, method)(**args)
+            except Exception as e:
+                report['errors'].append(f'{method}: {e}')
+        self.journal = journal
+        return report
+
+    def close_journal(self) -> None:
+        '''
+        Закрытие журнала изменений при штатном завершении.
+        '''
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def set_checkpoint(self, filepath: str) -> None:
+        if self.journal is not None:
+            self.journal.reset(filepath)
+
+    def log(self, method: str, **args) -> None:
+        '''
+        Запись изменения данных в журнал.
+        '''
+        if self.journal is not None:
+            self.journal.append(method, args)
 
     def get_data(self) -> dict:
         '''
@@ -282,7 +694,8 @@ class Control(object):
         json_list = file_methods.get_list_json_in_folder(dirpath)
         if json_list == []:
             raise NoneJsonError
-        return file_methods.get_jsons_data(json_list)
+        # описатели читаются и проверяются один раз, пока файлы не изменятся
+        return file_methods.catalogue.get_descriptors(json_list)
 
     @classmethod
     def get_json_categories(cls, dirpath: str) -> dict:
@@ -304,15 +717,19 @@ class Control(object):
             category = item_info[0]
             self.data[new_name] = self.data[category]
             del self.data[category]
-            return
-        if len(item_info) == 2:
+            if self.follow_info and self.follow_info['category'] == category:
+                self.follow_info['category'] = new_name
+        elif len(item_info) == 2:
             category, adr = item_info
             self.data[category][new_name] = self.data[category][adr]
             del self.data[category][adr]
-            return
-        category, adr, column = item_info
-        self.data[category][adr] = self.data[category][adr].rename(
-            columns={column: new_name}
+        else:
+            category, adr, column = item_info
+            self.data[category][adr] = self.data[category][adr].rename(
+                columns={column: new_name}
+            )
+        self.log(
+            'change_column_name', item_info=list(item_info), new_name=new_name
         )
 
     def delete_item(self, item_info: list) -> None:
@@ -321,13 +738,13 @@ class Control(object):
         if len(item_info) == 1:
             category = item_info[0]
             del self.data[category]
-            return
-        if len(item_info) == 2:
+        elif len(item_info) == 2:
             category, adr = item_info
             del self.data[category][adr]
-            return
-        category, adr, column = item_info
-        self.data[category][adr].drop(column, axis=1, inplace=True)
+        else:
+            category, adr, column = item_info
+            self.data[category][adr].drop(column, axis=1, inplace=True)
+        self.log('delete_item', item_info=list(item_info))
 
     def concatenate_unch(self, input_category: str, input_adr: str, target_adr: str):
         # TODO убрать это в модель
@@ -356,3 +773,7 @@ class Control(object):
             self.data['CALC'][target_adr] = result
         else:
             self.data['CALC'] = {target_adr: result}
+        self.log(
+            'concatenate_unch', input_category=input_category,
+            input_adr=input_adr, target_adr=target_adr
+        )
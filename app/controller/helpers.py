@@ -1,5 +1,9 @@
+import logging
+import os
 import re
+from logging.handlers import RotatingFileHandler
 
+from PyQt5.QtCore import QStandardPaths
 from PyQt5.QtGui import QColor, QPalette
 
 
@@ -114,13 +118,76 @@ def default_settings(settings, app_version) -> None:
     settings.setValue('graphs', graphs)
     filters = []
     settings.setValue('left_menu_filters', filters)
-    main_settings = {
+    settings.setValue('main_settings', get_default_main_settings())
+
+
+def get_default_main_settings() -> dict:
+    '''
+    Функция получения стандартных общих настроек приложения
+    '''
+    return {
         'theme': 'dark',
         'json_dir': 'templates/',
         'tool_bar': 'left',
-        'open_last_file': True
+        'open_last_file': True,
+        'pdd_workers': 1,
+        'text_workers': os.cpu_count() or 1,
+        'session_codec': 'zlib',
+        'session_level': 1,
+        'session_workers': os.cpu_count() or 1,
+        'pdd_cache_dir': 'cache/',
+        'pdd_cache_size': 2048,
+        'journal_file': 'session.journal'
+    }
+
+
+def update_main_settings(settings) -> None:
+    '''
+    Функция дополнения сохранённых общих настроек стандартными
+    значениями новых настроек, которых в них ещё нет
+    '''
+    main_settings = {
+        **get_default_main_settings(),
+        **settings.value('main_settings')
     }
-    settings.setValue('main_settings', main_settings)
+    if main_settings != settings.value('main_settings'):
+        settings.setValue('main_settings', main_settings)
+
+
+def get_app_data_path(filepath: str) -> str:
+    '''
+    Функция получения пути к файлу данных приложения: относительный путь
+    отсчитывается от папки данных пользователя, а не от текущей папки.
+    '''
+    if os.path.isabs(filepath):
+        return filepath
+    return os.path.join(
+        QStandardPaths.writableLocation(QStandardPaths.AppDataLocation),
+        filepath
+    )
+
+
+def set_logging(filename: str) -> None:
+    '''
+    Функция настройки журнала сообщений программы (в том числе отчётов
+    распаковки pdd файлов): сообщения уровня INFO и выше пишутся в файл
+    filename в папке данных пользователя, старые части файла сменяются
+    по размеру. Если папка недоступна для записи, сообщения выводятся
+    в поток ошибок.
+    '''
+    filepath = get_app_data_path(filename)
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        handler = RotatingFileHandler(
+            filepath, maxBytes=1 << 20, backupCount=2, encoding='utf8'
+        )
+    except OSError:
+        handler = logging.StreamHandler()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+        handlers=[handler]
+    )
 
 
 def get_palette(color) -> QPalette:
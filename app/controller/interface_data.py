@@ -23,6 +23,8 @@ def get_actions_list() -> list:
                'Открыть pdd файл с данными.', None, False, ('get_open_file_window', 'pdd')),
         Action('open_csv_action', 'Открыть *.csv', ':file-text.svg',
                'Открыть csv файл с данными.', None, False, ('get_open_file_window', 'csv')),
+        Action('follow_pdd_action', 'Следить за pdd', ':refresh-cw.svg',
+               'Дописывать новые записи последнего открытого pdd файла', None, True, 'follow_pdd'),
         Action('open_gzip_action', 'Открыть *.gzip', ':github.svg',
                'Открыть gzip файл с данными.', 'Ctrl+O', False, 'open_gzip_file'),
         Action('save_gzip_action', 'Сохранить как *.gzip...', ':save.svg',
@@ -94,6 +96,7 @@ def get_menu_dict() -> dict:
                 ],
                 Submenu('Открыть gzip или pdd', ':database.svg'): [
                     'open_pdd_action',
+                    'follow_pdd_action',
                     'open_gzip_action'
                 ],
                 Submenu('Сохранить как', ':save'): [
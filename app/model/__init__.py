@@ -1,3 +1,10 @@
+from .cache import PddCache
 from .calculate import Mathematical
+from .catalogue import DescriptorCatalogue
 from .file import Datas as file_methods
+from .index import PddIndex
+from .journal import SessionJournal
 from .map import FlightMap
+from .pdd import AdrPlan, PddTable, RecordWords
+from .session import Session, SessionTable
+from .table import LazyTable, SparseColumn
@@ -0,0 +1,156 @@
+import hashlib
+import json as js
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+
+class PddCache(object):
+    '''
+    Дисковый кэш распакованных pdd файлов.
+    Для каждого АДР хранятся тики времени и слова записей в формате .npy.
+    Ключ записи кэша - путь, размер и время изменения pdd файла плюс хэш
+    описателя, поэтому изменение любого из них даёт новый ключ, а старые
+    записи вытесняются по давности использования (LRU), когда размер
+    папки кэша превышает max_size.
+    '''
+
+    meta_name = 'meta.json'
+    version = 1
+
+    def __init__(self, dirpath: str, max_size: int) -> None:
+        '''__init__
+
+        Args:
+            dirpath (str): папка кэша
+            max_size (int): максимальный размер кэша в байтах
+        '''
+        self.dirpath = dirpath
+        self.max_size = max_size
+
+    @staticmethod
+    def get_file_key(filepath: str) -> str:
+        stat = os.stat(filepath)
+        key = f'{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}'
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def get_descriptor_key(json_data) -> str:
+        key = js.dumps(json_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+    def get_entry_path(self, filepath: str, json_data) -> str:
+        return os.path.join(
+            self.dirpath,
+            f'{self.get_file_key(filepath)[:20]}_'
+            f'{self.get_descriptor_key(json_data)[:20]}'
+        )
+
+    def load(self, filepath: str, json_data) -> tuple | None:
+        '''
+        Получение распакованных данных из кэша.
+        Возвращает словарь {имя АДР: (тики, слова, сведения о времени)},
+        смещение конца распакованных записей и число записей
+        по контрольным суммам или None, если записи в кэше нет.
+        Массивы отображаются в память, а не читаются целиком.
+        '''
+        entry_path = self.get_entry_path(filepath, json_data)
+        meta_path = os.path.join(entry_path, self.meta_name)
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf8') as file:
+                meta = js.load(file)
+            if meta.get('version') != self.version:
+                raise ValueError(meta.get('version'))
+            result = {}
+            for number, adr_name in enumerate(meta['adrs']):
+                result[adr_name] = tuple(
+                    np.load(
+                        os.path.join(entry_path, f'{number}_{name}.npy'),
+                        mmap_mode='r'
+                    )
+                    for name in ('time', 'words')
+                ) + (meta['info'][number],)
+            checksums = {
+                int(checksum): count
+                for checksum, count in meta['checksums'].items()
+            }
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+        # отметка использования для вытеснения по давности
+        os.utime(meta_path)
+        return result, meta['offset'], checksums
+
+    def save(
+        self,
+        filepath: str,
+        json_data,
+        adrs: dict,
+        offset: int,
+        checksums: dict
+    ) -> None:
+        '''
+        Запись распакованных данных в кэш.
+        adrs - словарь {имя АДР: (тики, слова, сведения о времени)},
+        сведения о времени - словарь, сохраняемый в json.
+        checksums - число записей файла по контрольным суммам.
+        Запись идёт во временную папку, которая затем переименовывается,
+        чтобы в кэше не оставалось недописанных записей.
+        '''
+        entry_path = self.get_entry_path(filepath, json_data)
+        if os.path.isdir(entry_path):
+            return
+        os.makedirs(self.dirpath, exist_ok=True)
+        temp_path = os.path.join(self.dirpath, f'.{uuid.uuid4().hex}')
+        os.makedirs(temp_path)
+        try:
+            for number, (ticks, words, _) in enumerate(adrs.values()):
+                np.save(os.path.join(temp_path, f'{number}_time.npy'), ticks)
+                np.save(os.path.join(temp_path, f'{number}_words.npy'), words)
+            meta = {
+                'version': self.version,
+                'source': os.path.abspath(filepath),
+                'adrs': list(adrs),
+                'info': [info for _, _, info in adrs.values()],
+                'offset': offset,
+                'checksums': checksums
+            }
+            with open(
+                os.path.join(temp_path, self.meta_name), 'w', encoding='utf8'
+            ) as file:
+                js.dump(meta, file, ensure_ascii=False)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        '''
+        Удаление давно не использованных записей, пока размер кэша
+        больше max_size.
+        '''
+        entries = []
+        for item in os.scandir(self.dirpath):
+            if not item.is_dir() or item.name.startswith('.'):
+                continue
+            meta_path = os.path.join(item.path, self.meta_name)
+            try:
+                size = sum(
+                    file.stat().st_size for file in os.scandir(item.path)
+                    if file.is_file()
+                )
+                entries.append((os.path.getmtime(meta_path), size, item.path))
+            except OSError:
+                # запись без meta или удалённая другим потоком
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
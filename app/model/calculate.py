@@ -12,10 +12,22 @@ class Mathematical(object):
     d - исходные данные, которые необходимо рассчитать.
     *_acc - средние величины.
     intervals_* - интервалы, получаемые рассчетным образом.
+    time_scale - длительность тика времени, если время данных получено
+    из целых тиков, тогда поиск по времени идёт по тикам.
     '''
 
-    def __init__(self, object: DataFrame) -> None:
+    def __init__(
+        self,
+        object: DataFrame,
+        time_scale: float | None = None
+    ) -> None:
         self.d = object.astype(np.float64)
+        self.time_scale = time_scale
+        self.ticks = None
+        if time_scale:
+            self.ticks = np.rint(
+                self.d['time'].to_numpy() / time_scale
+            ).astype(np.int64)
         self.Wxc_KBTIi_acc = 0
         self.Wzc_KBTIi_acc = 0
         self.Wyc_KBTIi_acc = 0
@@ -163,7 +175,11 @@ class Mathematical(object):
         '''
         if not 'JVD_H' in self.d.columns:
             return 0
-        result = self.d.loc[self.d['time'] == start, 'JVD_H'].values
+        if self.ticks is not None:
+            mask = self.ticks == round(start / self.time_scale)
+        else:
+            mask = self.d['time'] == start
+        result = self.d.loc[mask, 'JVD_H'].values
         if len(result) > 0:
             return result[0]
         else:
@@ -0,0 +1,80 @@
+import json as js
+import os
+
+from .pdd import AdrPlan
+
+
+class DescriptorCatalogue(object):
+    '''
+    Каталог json описателей АДР.
+    Каждый файл читается и проверяется один раз и хранится вместе
+    со скомпилированными планами распаковки АДР, пока не изменились
+    его размер и время изменения. Планы берутся из каталога при каждой
+    распаковке с тем же описателем.
+    '''
+
+    def __init__(self) -> None:
+        # путь -> (размер, время изменения, описатель)
+        self._entries: dict = {}
+        # id описания АДР -> (описание, план); описание хранится, чтобы
+        # id не перешёл к другому объекту
+        self._plans: dict = {}
+
+    @staticmethod
+    def get_stat(filepath: str) -> tuple:
+        stat = os.stat(filepath)
+        return stat.st_size, stat.st_mtime_ns
+
+    def load(self, filepath: str) -> dict:
+        '''
+        Получение описателя из файла filepath.
+        Файл перечитывается, только если он изменился.
+        '''
+        stat = self.get_stat(filepath)
+        entry = self._entries.get(filepath)
+        if entry is not None and entry[0] == stat:
+            return entry[1]
+        with open(filepath, 'r', encoding='utf8') as file:
+            descriptor = js.load(file)
+        plans = self.compile(descriptor, filepath)
+        if entry is not None:
+            for adr in entry[1]['adr']:
+                self._plans.pop(id(adr), None)
+        for adr, plan in zip(descriptor['adr'], plans):
+            self._plans[id(adr)] = (adr, plan)
+        self._entries[filepath] = (stat, descriptor)
+        return descriptor
+
+    @staticmethod
+    def compile(descriptor: dict, filepath: str = '') -> list:
+        '''
+        Проверка описателя и компиляция планов распаковки его АДР.
+        При ошибке в описателе вызывается KeyError с именем файла и АДР.
+        '''
+        for key in ('name', 'adr'):
+            if key not in descriptor:
+                raise KeyError(f'{filepath}: нет поля {key}')
+        plans = []
+        for adr in descriptor['adr']:
+            try:
+                plans.append(AdrPlan(adr))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                name = adr.get('adr_name') if isinstance(adr, dict) else adr
+                raise KeyError(f'{filepath}: {name}: {e}') from e
+        return plans
+
+    def get_descriptors(self, filepaths: list) -> list:
+        return [self.load(filepath) for filepath in filepaths]
+
+    def get_plan(self, adr: dict) -> AdrPlan:
+        '''
+        План распаковки АДР: из каталога, если описание АДР получено
+        из каталога, иначе компилируется заново.
+        '''
+        item = self._plans.get(id(adr))
+        if item is not None and item[0] is adr:
+            return item[1]
+        return AdrPlan(adr)
+
+    def get_plans(self, json_data: list) -> list:
+        return [self.get_plan(adr) for adr in json_data]
@@ -1,31 +1,223 @@
 import gzip
+import io
 import json as js
+import logging
 import os
 import pickle
+from concurrent.futures import (CancelledError, ThreadPoolExecutor,
+                                as_completed)
+from functools import partial
+from time import perf_counter
 
 import chardet as cd
 import numpy as np
 import openpyxl
 import pandas as pd
 
+from .cache import PddCache
+from .catalogue import DescriptorCatalogue
+from .index import PddIndex
+from .pdd import AdrPlan, PddTable, RecordWords
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+# Структура записи pdd файла: время, контрольная сумма, резерв, 16 слов данных
+PDD_RECORD_DTYPE = np.dtype({
+    'names': ['time', 'cs', 'null', 'values'],
+    'formats': ['>u4', 'u2', '4b', '>16u2'],
+})
+# Размер части txt/csv файла при параллельном разборе, байт
+TEXT_CHUNK_SIZE = 16 << 20
+# Число записей файла, обрабатываемых за шаг потоковой распаковки
+PDD_STREAM_CHUNK = 200000
+# Число записей подряд, подтверждающих (или при неизвестных суммах
+# нарушающих) выравнивание при восстановлении повреждённого файла
+PDD_RESYNC_RECORDS = 4
+# Размер окна поиска выравнивания, байт
+PDD_RESYNC_WINDOW = 1 << 20
+# Число мест файла между первой и последней записью, в которых
+# проверяется выравнивание перед чтением файла без поиска участков
+PDD_ALIGN_SAMPLES = 64
+# Шаг записей одной контрольной суммы в индексе pdd файла
+PDD_INDEX_STEP = 1024
+# Диапазон счётчика времени записи (поле time, 32 бита)
+PDD_TICK_RANGE = 1 << 32
+# Наибольший разрыв времени при переполнении счётчика, в шагах записей.
+# Больший скачок назад считается сбросом счётчика
+PDD_TIME_MAX_GAP = 1000
+
 
 class Datas(object):
     '''
     Класс модели для работы с файлами.
+    catalogue - каталог json описателей с планами распаковки.
     '''
 
+    catalogue = DescriptorCatalogue()
+
     def __init__(self) -> None:
         pass
 
     @classmethod
-    def load_txt(cls, filepath: str) -> pd.DataFrame:
-        return pd.read_csv(
+    def load_txt(
+        cls,
+        filepath: str,
+        usecols=None,
+        dtype: dict | None = None,
+        workers: int = 1,
+        progress=None,
+        cancel=None
+    ) -> pd.DataFrame:
+        return cls.read_text(
             filepath,
+            usecols,
+            dtype,
+            workers,
+            progress,
+            cancel,
+            units=True,
             sep=cls._get_sep(filepath),
-            encoding=cls._get_enc(filepath),
-            skiprows=[1]
+            encoding=cls._get_enc(filepath)
         )
 
+    @classmethod
+    def read_text(
+        cls,
+        filepath: str,
+        usecols=None,
+        dtype: dict | None = None,
+        workers: int = 1,
+        progress=None,
+        cancel=None,
+        units: bool = False,
+        **kwargs
+    ) -> pd.DataFrame:
+        '''
+        Метод чтения текстового файла с разделителями.
+        usecols - имена нужных столбцов, остальные столбцы не разбираются,
+        отсутствующие в файле имена пропускаются.
+        dtype - типы столбцов (см. parse_text).
+        workers - число потоков: файл больше TEXT_CHUNK_SIZE делится
+        на части по границам строк, части разбираются параллельно
+        и объединяются по порядку.
+        progress - функция progress(прочитано байт, размер файла).
+        cancel - функция, возвращающая True, если чтение нужно прервать,
+        тогда вызывается CancelledError; при чтении за один проход
+        проверяется после разбора.
+        units - вторая строка файла содержит единицы измерения.
+        Значения в кавычках с переводом строки не поддерживаются
+        при делении на части.
+        '''
+        if usecols is not None:
+            columns = set(usecols)
+            kwargs['usecols'] = lambda column: column in columns
+        size = os.path.getsize(filepath)
+        encoding = kwargs.get('encoding') or 'utf8'
+        if (
+            workers <= 1 or size <= TEXT_CHUNK_SIZE
+            or '\n'.encode(encoding) != b'\n'
+        ):
+            if units:
+                kwargs['skiprows'] = [1]
+            data = cls.parse_text(filepath, dtype, **kwargs)
+            if cancel is not None and cancel():
+                raise CancelledError
+            if progress is not None:
+                progress(size, size)
+            return data
+
+        with open(filepath, 'rb') as file:
+            header = file.readline()
+            if units:
+                file.readline()
+            bounds = [file.tell()]
+            while bounds[-1] < size:
+                file.seek(bounds[-1] + TEXT_CHUNK_SIZE)
+                file.readline()
+                bounds.append(min(file.tell(), size))
+        names = pd.read_csv(
+            io.BytesIO(header),
+            nrows=0,
+            sep=kwargs.get('sep', ','),
+            encoding=kwargs.get('encoding')
+        ).columns
+        kwargs.update(header=None, names=list(names))
+
+        def parse(begin: int, end: int) -> pd.DataFrame | None:
+            if cancel is not None and cancel():
+                return None
+            with open(filepath, 'rb') as file:
+                file.seek(begin)
+                chunk = file.read(end - begin)
+            return cls.parse_text(io.BytesIO(chunk), dtype, **kwargs)
+
+        frames = [None] * (len(bounds) - 1)
+        done = bounds[0]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(parse, begin, end): number
+                for number, (begin, end) in enumerate(zip(bounds, bounds[1:]))
+            }
+            for future in as_completed(futures):
+                if cancel is not None and cancel():
+                    for item in futures:
+                        item.cancel()
+                    raise CancelledError
+                number = futures[future]
+                frames[number] = future.result()
+                done += bounds[number + 1] - bounds[number]
+                if progress is not None:
+                    progress(done, size)
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def parse_text(
+        source,
+        dtype: dict | None = None,
+        **kwargs
+    ) -> pd.DataFrame:
+        '''
+        Метод разбора текста с разделителями из файла или буфера.
+        dtype - типы столбцов. Если целый столбец содержит пропуски или
+        дробные числа, текст разбирается повторно с выводом типов целых
+        столбцов.
+        '''
+        if not dtype:
+            return pd.read_csv(source, **kwargs)
+        try:
+            return pd.read_csv(source, dtype=dtype, **kwargs)
+        except ValueError:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return pd.read_csv(
+                source,
+                dtype={
+                    name: value for name, value in dtype.items()
+                    if np.dtype(value).kind == 'f'
+                },
+                **kwargs
+            )
+
+    @classmethod
+    def get_text_schema(cls, adr: dict) -> tuple:
+        '''
+        Метод получения известных столбцов АДР и их типов для чтения
+        txt и csv файлов: поля описателя (включая поля групп), время
+        (name или time) и координаты.
+        Поля с коэффициентом читаются как float64, остальные как int64,
+        узкие целые типы не используются, так как при разборе значения
+        вне диапазона молча переполняются.
+        '''
+        plan = cls.catalogue.get_plan(adr)
+        dtype = {
+            name: np.float64 if plan.koefs[i] != 1 else np.int64
+            for name, i in plan.field_index.items()
+        }
+        for name in ('name', 'time', 'latitude', 'longitude'):
+            dtype[name] = np.float64
+        return list(dtype), dtype
+
     @staticmethod
     def _get_sep(filepath: str) -> str:
         return '\t' if '.txt' in filepath else ','
@@ -80,22 +272,43 @@ class Datas(object):
         wb.close()
 
     @staticmethod
-    def write_gzip(data: dict, filepath: str) -> None:
-        with gzip.open(filepath, 'wb', compresslevel=1) as f:
-            pickle.dump(data, f)
+    def write_gzip(
+        data: dict,
+        filepath: str,
+        codec: str | None = None,
+        level: int | None = None,
+        workers: int = 1
+    ) -> None:
+        Session.write(data, filepath, codec, level, workers)
 
     @staticmethod
     def write_csv(data: pd.DataFrame, filepath: str) -> None:
         data.to_csv(filepath, index=False, sep=';')
 
     @staticmethod
-    def load_gzip(filepath: str) -> dict:
+    def load_gzip(filepath: str, workers: int = 1) -> dict:
+        '''
+        Открытие файла сеанса. Файлы прежнего формата (pickle в gzip)
+        читаются целиком.
+        '''
+        if Session.is_session(filepath):
+            return Session.load(filepath, workers)
         with gzip.open(filepath, 'rb') as f:
             return pickle.load(f)
 
-    @staticmethod
-    def load_csv(filepath: str) -> pd.DataFrame:
-        return pd.read_csv(filepath)
+    @classmethod
+    def load_csv(
+        cls,
+        filepath: str,
+        usecols=None,
+        dtype: dict | None = None,
+        workers: int = 1,
+        progress=None,
+        cancel=None
+    ) -> pd.DataFrame:
+        return cls.read_text(
+            filepath, usecols, dtype, workers, progress, cancel
+        )
 
     @staticmethod
     def load_python_script(filepath: str) -> str:
@@ -132,137 +345,959 @@ class Datas(object):
         return [cls.load_json(filepath) for filepath in list_json]
 
     @staticmethod
-    def get_mask_shift_from_field(size: str) -> tuple:
-        # получаем маску и смещение для побитового сравнения и получения данных
-        start, stop = [int(i) for i in size.split(':')]
-        number_mask = int('1' * (stop - start + 1), 2)
-        shift = start
-        return number_mask, shift
+    def get_unpacked_data_list(filepath: str, offset: int = 0) -> np.ndarray:
+        '''
+        Метод получения записей pdd файла начиная со смещения offset.
+        Файл не читается в память целиком, а отображается через np.memmap,
+        страницы подгружаются системой по мере обращения к записям.
+        Неполная запись в конце файла (файл ещё пишется) не учитывается.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        count = (os.path.getsize(filepath) - offset) // itemsize
+        if count <= 0:
+            return np.empty(0, dtype=PDD_RECORD_DTYPE)
+        return np.memmap(
+            filepath,
+            dtype=PDD_RECORD_DTYPE,
+            mode='r',
+            offset=offset,
+            shape=(count,)
+        )
 
     @staticmethod
-    def get_unpacked_data_list(filepath: str) -> np.ndarray:
-        with open(filepath, 'rb') as file:
-            string = file.read()
-            dtype = {
-                'names': ['time', 'cs', 'null', 'values'], 'formats': ['>u4', 'u2', '4b', '>16u2'],
-            }
-            unpacked_data_list = np.frombuffer(string, dtype=dtype)
-            unpacked_data_list = unpacked_data_list[['time', 'cs', 'values']]
-        return unpacked_data_list
+    def get_checksum_lookup(checksums) -> np.ndarray:
+        '''
+        Таблица известных контрольных сумм для проверки
+        принадлежности одним обращением по индексу.
+        '''
+        lookup = np.zeros(1 << 16, dtype=bool)
+        lookup[list(checksums)] = True
+        return lookup
+
+    @staticmethod
+    def get_frequent_checksums(
+        data: np.ndarray,
+        position: int,
+        lookup: np.ndarray
+    ) -> np.ndarray:
+        '''
+        Метод получения таблицы контрольных сумм АДР, которых нет
+        в описателе, по записям начиная с выровненного байта position.
+        Учитываются суммы записей между двумя записями с известными
+        суммами, поэтому после потери выравнивания случайные значения
+        в таблицу не попадают. Без этих сумм участки записей других АДР
+        принимались бы за повреждения.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        count = min((len(data) - position) // itemsize, PDD_STREAM_CHUNK)
+        records = data[position:position + count * itemsize].view(
+            PDD_RECORD_DTYPE
+        )
+        cs = records['cs']
+        known = lookup[cs]
+        inner = known[:-2] & known[2:]
+        frequency = np.bincount(cs[1:-1][inner], minlength=1 << 16)
+        return frequency >= PDD_RESYNC_RECORDS
+
+    @staticmethod
+    def get_aligned_count(
+        data: np.ndarray,
+        position: int,
+        lookup: np.ndarray
+    ) -> int:
+        '''
+        Метод подсчёта записей выровненного участка, начинающегося
+        с байта position.
+        Участок заканчивается последней записью с известной контрольной
+        суммой перед PDD_RESYNC_RECORDS неизвестными подряд (потеря
+        выравнивания) или концом файла. Одиночные записи с неизвестной
+        суммой внутри участка допускаются.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        total = (len(data) - position) // itemsize
+        last_valid = -1
+        checked = 0
+        while checked < total:
+            number = min(PDD_STREAM_CHUNK, total - checked)
+            start = position + checked * itemsize
+            records = data[start:start + number * itemsize].view(
+                PDD_RECORD_DTYPE
+            )
+            valid = np.flatnonzero(lookup[records['cs']]) + checked
+            gaps = np.diff(valid, prepend=last_valid) - 1
+            broken = np.flatnonzero(gaps >= PDD_RESYNC_RECORDS)
+            if len(broken):
+                return last_valid + 1 if broken[0] == 0 else (
+                    int(valid[broken[0] - 1]) + 1
+                )
+            if len(valid):
+                last_valid = int(valid[-1])
+            checked += number
+            if checked - 1 - last_valid >= PDD_RESYNC_RECORDS:
+                break
+        return last_valid + 1
+
+    @staticmethod
+    def find_alignment(
+        data: np.ndarray,
+        position: int,
+        lookup: np.ndarray
+    ) -> int | None:
+        '''
+        Метод поиска ближайшего с байта position начала записи,
+        за которым идут PDD_RESYNC_RECORDS записей с известными
+        контрольными суммами с шагом в размер записи.
+        Поиск ведётся окнами по всем байтовым смещениям сразу,
+        окно растёт до PDD_RESYNC_WINDOW байт.
+        Возвращает смещение найденной записи или None.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        cs_dtype, cs_offset = PDD_RECORD_DTYPE.fields['cs'][:2]
+        # окно растёт от нескольких записей, так как обычно выравнивание
+        # находится сразу за местом повреждения
+        window_size = 16 * PDD_RESYNC_RECORDS * itemsize
+        while position + itemsize <= len(data):
+            stop = min(
+                len(data),
+                position + window_size + PDD_RESYNC_RECORDS * itemsize
+            )
+            window = data[position:stop]
+            # контрольная сумма при начале записи в каждом байте окна
+            cs = np.ndarray(
+                shape=(len(window) - cs_offset - cs_dtype.itemsize + 1,),
+                dtype=cs_dtype,
+                buffer=window,
+                offset=cs_offset,
+                strides=(1,)
+            )
+            starts = np.flatnonzero(lookup[cs])
+            starts = starts[
+                starts < min(window_size, len(window) - itemsize + 1)
+            ]
+            confirmed = np.ones(len(starts), dtype=bool)
+            for number in range(1, PDD_RESYNC_RECORDS):
+                following = starts + number * itemsize
+                # за концом файла записей нет, проверять нечего
+                whole = following + itemsize <= len(window)
+                confirmed &= ~whole | lookup[
+                    cs[np.minimum(following, len(cs) - 1)]
+                ]
+            if confirmed.any():
+                return position + int(starts[np.argmax(confirmed)])
+            position += window_size
+            window_size = min(2 * window_size, PDD_RESYNC_WINDOW)
+        return None
 
     @classmethod
-    def unpack_element(
+    def get_record_segments(
         cls,
-        byteswap: bool,
-        field_data: dict,
-        data_source: np.ndarray
-    ) -> np.ndarray:
-        position = field_data['position']
-        koef = field_data['koef']
-        size = field_data['size']
-        type = field_data['type']
-        mask, shift = cls.get_mask_shift_from_field(size)
-        data_column = data_source[:, position]
-        # if type == 'uint16' or type == 'pre':
-        #     data_column = data_column.astype(np.uint16)
-        if mask != 65535 or shift != 0:
-            data_column = np.bitwise_and(data_column, (mask << shift))
-            data_column = np.right_shift(data_column, shift)
-        else:
-            data_column = data_column
-        if not byteswap:
-            data_column = data_column.byteswap()
-
-        if type == 'int16':
-            data_column = data_column.astype(np.int16)
-        if type == 'int8':
-            data_column = data_column.astype(np.int8)
-        if type == 'uint16':
-            data_column = data_column.astype(np.uint16)
-        if type == 'pre':
-            data_column = data_column.astype(np.int8)
-        if koef != 1:
-            data_column = data_column.astype(np.float64) * koef
-
-        return data_column
+        filepath: str,
+        checksums,
+        offset: int = 0
+    ) -> tuple:
+        '''
+        Метод поиска выровненных участков записей в повреждённом
+        (обрезанном или с потерянными байтами) pdd файле.
+        checksums - известные контрольные суммы описателя, к ним
+        добавляются частые суммы начала файла.
+        Возвращает список участков (смещение, число записей)
+        и число пропущенных байт.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        size = os.path.getsize(filepath)
+        if size - offset < itemsize:
+            return [], max(size - offset, 0)
+        data = np.memmap(filepath, dtype=np.uint8, mode='r', offset=offset)
+        lookup = cls.get_checksum_lookup(checksums)
+        first = cls.find_alignment(data, 0, lookup)
+        if first is None:
+            return [], size - offset
+        lookup |= cls.get_frequent_checksums(data, first, lookup)
+        # записи перед первым найденным выравниванием с той же фазой
+        # относятся к участку, пока их суммы известны
+        head = data[first % itemsize:first].view(PDD_RECORD_DTYPE)
+        invalid = np.flatnonzero(~lookup[head['cs']])
+        start = first
+        if len(head):
+            start = first % itemsize + (
+                int(invalid[-1]) + 1 if len(invalid) else 0
+            ) * itemsize
+        segments = []
+        while start is not None:
+            count = cls.get_aligned_count(data, start, lookup)
+            if not count:
+                start = cls.find_alignment(data, start + 1, lookup)
+                continue
+            end = start + count * itemsize
+            while True:
+                position = cls.find_alignment(data, end, lookup)
+                if position is None or (position - start) % itemsize:
+                    break
+                # выравнивание не терялось, записи с неизвестными
+                # суммами остаются внутри участка
+                end = position + cls.get_aligned_count(
+                    data, position, lookup
+                ) * itemsize
+            segments.append((offset + start, (end - start) // itemsize))
+            start = position
+        skipped = size - offset - sum(
+            count for _, count in segments
+        ) * itemsize
+        return segments, skipped
 
     @classmethod
-    def unpack_group(
-            cls,
-            byteswap: bool,
-            group_info: dict,
-            data_source: np.ndarray,
-            result_data: dict) -> None:
-        if type(group_info['fields']) == list:
-            for field in group_info['fields']:
-                column_name = field['name']
-                column = cls.unpack_element(byteswap, field, data_source)
-                result_data[column_name] = column
-        else:
-            mask_condition, shift_condition = cls.get_mask_shift_from_field(
-                group_info['condition_bit'])
-            condition_data = (
-                data_source[:, group_info['condition_byte']]
-                & (mask_condition << shift_condition)
-            ) >> shift_condition
-            for condition, fields in group_info['fields'].items():
-                condition_mask = condition_data == int(condition)
-                for field in fields:
-                    column_name = field['name']
-                    column = cls.unpack_element(byteswap, field, data_source)
-
-                    # for i in range(1, len(column)):
-                    #     if not condition_mask[i]:
-                    #         column[i] = column[i - 1]
-
-                    column = np.where(condition_mask, column, 0)
-                    result_data[column_name] = column
+    def is_aligned(cls, records: np.ndarray, checksums) -> bool:
+        '''
+        Метод выборочной проверки выравнивания записей файла.
+        В начале, в конце и в PDD_ALIGN_SAMPLES местах между ними среди
+        PDD_RESYNC_RECORDS записей подряд должна быть запись с известной
+        контрольной суммой (описателя или частой в начале файла).
+        Потерянные или лишние байты сдвигают все следующие записи,
+        и их суммы становятся случайными.
+        '''
+        count = len(records)
+        if not count:
+            return True
+        lookup = cls.get_checksum_lookup(checksums)
+        cs = records['cs']
+        if not lookup[cs[:PDD_STREAM_CHUNK]].any():
+            # записей описателя в начале файла нет, проверять не по чему
+            return True
+        lookup |= cls.get_frequent_checksums(records.view(np.uint8), 0, lookup)
+        starts = np.linspace(
+            0, max(count - PDD_RESYNC_RECORDS, 0), PDD_ALIGN_SAMPLES + 2
+        ).astype(np.intp)
+        windows = starts[:, None] + np.arange(min(count, PDD_RESYNC_RECORDS))
+        return bool(lookup[cs[windows]].any(axis=1).all())
+
+    @classmethod
+    def get_record_parts(cls, filepath: str, checksums) -> tuple:
+        '''
+        Метод получения записей pdd файла выровненными частями.
+        Если выборочная проверка (is_aligned) не находит сдвига записей,
+        файл отдаётся одной частью, иначе части ищутся по известным
+        контрольным суммам.
+        Возвращает список частей, смещение конца последней части, число
+        пропущенных байт и размер неполной записи в конце файла (файл
+        ещё пишется), которая повреждением не считается.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        size = os.path.getsize(filepath)
+        records = cls.get_unpacked_data_list(filepath)
+        if cls.is_aligned(records, checksums):
+            tail = size % itemsize
+            return [records], size - tail, 0, tail
+        segments, skipped = cls.get_record_segments(filepath, checksums)
+        parts = [
+            np.memmap(
+                filepath,
+                dtype=PDD_RECORD_DTYPE,
+                mode='r',
+                offset=start,
+                shape=(count,)
+            )
+            for start, count in segments
+        ]
+        offset, tail = 0, 0
+        if segments:
+            start, count = segments[-1]
+            offset = start + count * itemsize
+            if size - offset < itemsize:
+                tail = size - offset
+        return parts, offset, skipped - tail, tail
+
+    @staticmethod
+    def get_checksum_partition(source_data: np.ndarray) -> dict:
+        '''
+        Метод разбиения записей по контрольной сумме за один проход.
+        Возвращает словарь {контрольная сумма: номера записей},
+        порядок записей внутри каждой суммы сохраняется.
+        '''
+        control_sum = np.asarray(source_data['cs'])
+        order = np.argsort(control_sum, kind='stable')
+        sorted_sum = control_sum[order]
+        bounds = np.flatnonzero(sorted_sum[1:] != sorted_sum[:-1]) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [len(order)]))
+        return {
+            int(sorted_sum[start]): order[start:stop]
+            for start, stop in zip(starts, stops) if stop > start
+        }
 
     @staticmethod
     def get_filtered_data_by_checksum(
         checksum: int,
-        source_data: np.ndarray
+        source_data: np.ndarray,
+        partition: dict | None = None
     ) -> np.ndarray:
+        if partition is not None:
+            indexes = partition.get(checksum, np.empty(0, dtype=np.intp))
+            return source_data[indexes]
         control_sum = source_data['cs']
         control_sum_mask = control_sum == checksum
         data_list = source_data[control_sum_mask]
         return data_list
 
     @staticmethod
-    def get_time_list(koef: float, source: np.ndarray) -> np.ndarray:
-        time_list = source['time']
-        time_list = time_list.byteswap() * koef
-        return time_list
+    def get_tick_list(
+        source: np.ndarray,
+        indexes: np.ndarray | None = None
+    ) -> np.ndarray:
+        '''
+        Метод получения тиков счётчика времени записей.
+        indexes - номера записей, по умолчанию все записи; выбирается
+        только поле времени, записи целиком не копируются.
+        '''
+        time = source['time']
+        if indexes is not None:
+            time = time[indexes]
+        return time.byteswap().astype(np.int64)
 
-    @classmethod
-    def unpack_fields(cls, byteswap, fields, data_list, result_dict) -> dict:
-        for field in fields:
-            if 'group' in field.keys() and field['group'] == True:
-                cls.unpack_group(byteswap, field, data_list, result_dict)
-            else:
-                column_name = field['name']
-                column = cls.unpack_element(byteswap, field, data_list)
-                result_dict[column_name] = column
+    @staticmethod
+    def unwrap_ticks(ticks: np.ndarray, last: tuple | None = None) -> tuple:
+        '''
+        Метод восстановления монотонных тиков времени.
+        Уменьшение тиков считается переполнением счётчика (wrap), если
+        после прибавления PDD_TICK_RANGE шаг не больше PDD_TIME_MAX_GAP
+        предыдущих шагов, иначе сбросом счётчика (reset), после которого
+        время продолжается с предыдущим шагом.
+        last - состояние после предыдущей части: исходные и восстановленные
+        тики последней записи и последний шаг.
+        Возвращает восстановленные тики, список разрывов
+        {'row', 'kind', 'before', 'after'} с исходными тиками до и после
+        и состояние для продолжения.
+        '''
+        raw = np.asarray(ticks, dtype=np.int64)
+        if last is not None:
+            raw = np.concatenate(([last[0]], raw))
+        steps = np.diff(raw)
+        positive = np.flatnonzero(steps > 0)
+        last_step = last[2] if last is not None else None
+        breaks = np.flatnonzero(steps < 0)
+        discontinuities = []
+        unwrapped = raw
+        if len(breaks):
+            default_step = last_step or (
+                int(np.median(steps[positive])) if len(positive) else 1
+            )
+            # последний положительный шаг перед каждым разрывом
+            previous = np.searchsorted(positive, breaks) - 1
+            corrections = np.zeros(len(raw), dtype=np.int64)
+            for number, row in zip(previous, breaks):
+                step = int(steps[positive[number]]) if number >= 0 else (
+                    default_step
+                )
+                wrapped = int(steps[row]) + PDD_TICK_RANGE
+                if 0 <= wrapped <= PDD_TIME_MAX_GAP * step:
+                    kind = 'wrap'
+                    corrections[row + 1] = PDD_TICK_RANGE
+                else:
+                    kind = 'reset'
+                    corrections[row + 1] = step - int(steps[row])
+                discontinuities.append({
+                    'row': int(row) + 1 - (last is not None),
+                    'kind': kind,
+                    'before': int(raw[row]),
+                    'after': int(raw[row + 1])
+                })
+            unwrapped = raw + np.cumsum(corrections)
+        if last is not None:
+            unwrapped = unwrapped[1:] + (last[1] - last[0])
+            raw = raw[1:]
+        state = last
+        if len(raw):
+            if len(positive):
+                last_step = int(steps[positive[-1]])
+            state = (int(raw[-1]), int(unwrapped[-1]), last_step)
+        return unwrapped, discontinuities, state
 
     @classmethod
-    def unpack_adr(cls, adr, unpacked_data_list) -> dict:
-        checksum = int(adr['checksum'], base=16)
-        data_list = cls.get_filtered_data_by_checksum(
-            checksum, unpacked_data_list
+    def get_time_axis(
+        cls,
+        koef: float,
+        source: np.ndarray,
+        last: tuple | None = None
+    ) -> tuple:
+        '''
+        Метод получения монотонного времени записей в секундах.
+        Возвращает время, состояние для продолжения и список разрывов.
+        '''
+        unwrapped, discontinuities, state = cls.unwrap_ticks(
+            cls.get_tick_list(source), last
         )
+        return unwrapped * koef, state, discontinuities
+
+    @classmethod
+    def get_time_list(cls, koef: float, source: np.ndarray) -> np.ndarray:
+        return cls.get_time_axis(koef, source)[0]
+
+    @classmethod
+    def unpack_records(cls, plan: AdrPlan, data_list: np.ndarray) -> dict:
         df_dict = {}
-        df_dict['time'] = cls.get_time_list(adr['time_koef'], data_list)
-        cls.unpack_fields(
-            adr['bytes_swap'], adr['fields'], data_list['values'], df_dict)
+        df_dict['time'] = cls.get_time_list(plan.time_koef, data_list)
+        df_dict.update(plan.decode(data_list['values']))
         return df_dict
 
     @classmethod
-    def load_pdd(cls, filepath_pdd: str, json_data: list) -> dict:
-        unpacked_data_list = cls.get_unpacked_data_list(filepath_pdd)
-        result_dict = {}
+    def unpack_adr(
+        cls,
+        adr: dict,
+        unpacked_data_list: np.ndarray,
+        partition: dict | None = None,
+        plan: AdrPlan | None = None
+    ) -> dict:
+        if plan is None:
+            plan = cls.catalogue.get_plan(adr)
+        data_list = cls.get_filtered_data_by_checksum(
+            plan.checksum, unpacked_data_list, partition
+        )
+        return cls.unpack_records(plan, data_list)
 
-        for adr in json_data:
-            adr_data = cls.unpack_adr(adr, unpacked_data_list)
-            result_dict[adr['adr_name']] = pd.DataFrame(adr_data)
+    @classmethod
+    def get_pdd_table(
+        cls,
+        plan: AdrPlan,
+        parts: list,
+        partitions: list,
+        workers: int = 1
+    ) -> PddTable:
+        '''
+        Метод создания ленивой таблицы АДР по частям записей файла
+        и их разбиению по контрольным суммам.
+        Сразу вычисляется только время, слова записей остаются
+        в отображённых частях файла (RecordWords), поля распаковываются
+        по запросу в workers потоках.
+        '''
+        indexes = [
+            partition.get(plan.checksum, np.empty(0, dtype=np.intp))
+            for partition in partitions
+        ]
+        ticks, discontinuities, state = cls.unwrap_ticks(np.concatenate([
+            cls.get_tick_list(part, index)
+            for part, index in zip(parts, indexes)
+        ]))
+        return PddTable(
+            plan,
+            RecordWords([part['values'].T for part in parts], indexes),
+            ticks,
+            discontinuities,
+            state,
+            workers
+        )
+
+    @classmethod
+    def load_pdd(
+        cls,
+        filepath_pdd: str,
+        json_data: list,
+        workers: int = 1,
+        report: dict | None = None,
+        cache: PddCache | None = None
+    ) -> dict:
+        '''
+        Метод загрузки pdd файла по описателю.
+        Возвращает словарь {имя АДР: PddTable}.
+        workers - число потоков построения таблиц АДР и распаковки их
+        полей при обращении (частями записей), при 1 - последовательно.
+        report - словарь, в который записывается отчёт распаковки
+        (см. get_decode_report), признак загрузки из кэша (cached)
+        и общее время загрузки (seconds). Отчёт также пишется в журнал.
+        cache - дисковый кэш, при повторном открытии файла с тем же
+        описателем данные берутся из него без распаковки.
+        '''
+        load_start = perf_counter()
+        plans = cls.catalogue.get_plans(json_data)
+        cached = cache.load(filepath_pdd, json_data) if cache else None
+        if cached is not None:
+            adrs, offset, checksums = cached
+            skipped = truncated = 0
+
+            def get_table(plan: AdrPlan) -> PddTable:
+                ticks, words, info = adrs[plan.name]
+                return PddTable(
+                    plan,
+                    words,
+                    ticks,
+                    info['discontinuities'],
+                    info['time_state'] and tuple(info['time_state']),
+                    workers
+                )
+        else:
+            parts, offset, skipped, truncated = cls.get_record_parts(
+                filepath_pdd, [plan.checksum for plan in plans]
+            )
+            # части повреждённого файла не склеиваются, каждая остаётся
+            # отображением своего участка файла
+            parts = parts or [np.empty(0, dtype=PDD_RECORD_DTYPE)]
+            partitions = [cls.get_checksum_partition(part) for part in parts]
+            checksums = {}
+            for partition in partitions:
+                for checksum, indexes in partition.items():
+                    checksums[checksum] = (
+                        checksums.get(checksum, 0) + len(indexes)
+                    )
+            checksums = dict(sorted(checksums.items()))
+            get_table = partial(
+                cls.get_pdd_table,
+                parts=parts,
+                partitions=partitions,
+                workers=workers
+            )
+
+        def get_timed_table(plan: AdrPlan) -> tuple:
+            start = perf_counter()
+            table = get_table(plan)
+            return table, perf_counter() - start
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(get_timed_table, plans))
+        else:
+            results = [get_timed_table(plan) for plan in plans]
+        tables = [table for table, _ in results]
+        # дописываемый файл (с неполной последней записью) не кэшируется
+        if cached is None and cache is not None and not (
+            skipped or truncated
+        ):
+            cache.save(
+                filepath_pdd,
+                json_data,
+                {
+                    plan.name: (
+                        table.raw_column('time'),
+                        table.words,
+                        {
+                            'discontinuities': table.discontinuities,
+                            'time_state': table.time_state
+                        }
+                    )
+                    for plan, table in zip(plans, tables)
+                },
+                offset,
+                checksums
+            )
+
+        decode_report = cls.get_decode_report(
+            plans, results, checksums, offset, skipped, truncated
+        )
+        decode_report['cached'] = cached is not None
+        decode_report['seconds'] = perf_counter() - load_start
+        logger.info(
+            'pdd %s\n%s',
+            filepath_pdd,
+            cls.get_decode_report_text(decode_report)
+        )
+        if report is not None:
+            report.update(decode_report)
+        return {plan.name: table for plan, table in zip(plans, tables)}
+
+    @staticmethod
+    def get_decode_report(
+        plans: list,
+        results: list,
+        checksums: dict,
+        offset: int,
+        skipped: int,
+        truncated: int = 0
+    ) -> dict:
+        '''
+        Метод составления отчёта распаковки pdd файла.
+        results - пары (таблица АДР, время её построения в секундах).
+        Отчёт содержит смещение конца распакованных записей, оно же
+        число обработанных байт (offset), число байт, пропущенных при
+        восстановлении выравнивания повреждённого файла (skipped), размер
+        неполной последней записи (truncated), число записей
+        по контрольным суммам (checksums), всего (records) и не подошедших
+        ни к одному АДР описателя (unmatched), число разрывов счётчика
+        времени по АДР (discontinuities) и для каждого АДР число записей,
+        время и скорость (записей в секунду) распаковки (adrs).
+        '''
+        records = sum(checksums.values())
+        matched = sum(
+            checksums.get(checksum, 0)
+            for checksum in {plan.checksum for plan in plans}
+        )
+        return {
+            'offset': offset,
+            'skipped': skipped,
+            'truncated': truncated,
+            'records': records,
+            'unmatched': records - matched,
+            'checksums': checksums,
+            'discontinuities': {
+                plan.name: len(table.discontinuities)
+                for plan, (table, _) in zip(plans, results)
+                if table.discontinuities
+            },
+            'adrs': {
+                plan.name: {
+                    'records': len(table),
+                    'seconds': seconds,
+                    'throughput': len(table) / seconds if seconds else 0.0
+                }
+                for plan, (table, seconds) in zip(plans, results)
+            },
+        }
+
+    @staticmethod
+    def get_decode_report_text(report: dict) -> str:
+        '''
+        Метод получения текста отчёта распаковки pdd файла.
+        '''
+        lines = [
+            f'Записей: {report["records"]}, '
+            f'не опознано: {report["unmatched"]}, '
+            f'{report["offset"] / 2 ** 20:.1f} МБ за {report["seconds"]:.2f} с'
+            + (' (кэш)' if report['cached'] else '')
+        ]
+        if report['skipped']:
+            lines.append(f'Пропущено байт: {report["skipped"]}')
+        if report.get('truncated'):
+            lines.append(
+                f'Неполная запись в конце файла: {report["truncated"]} байт'
+            )
+        lines.append('Суммы: ' + ', '.join(
+            f'{checksum:#06x} - {count}'
+            for checksum, count in sorted(report['checksums'].items())
+        ))
+        lines.extend(
+            f'{name} - {item["records"]} записей, {item["seconds"]:.3f} с, '
+            f'{item["throughput"]:.0f} записей/с'
+            for name, item in report['adrs'].items()
+        )
+        return '\n'.join(lines)
+
+    @staticmethod
+    def get_pdd_files(path: str) -> list:
+        '''
+        Метод получения списка pdd файлов папки path в порядке имён.
+        '''
+        return sorted(
+            item.path for item in os.scandir(path)
+            if item.is_file() and item.name.lower().endswith('.pdd')
+        )
+
+    @classmethod
+    def load_pdd_batch(
+        cls,
+        filepaths: list,
+        json_data: list,
+        workers: int = 1,
+        report: dict | None = None,
+        cache: PddCache | None = None,
+        progress=None,
+        cancel=None
+    ) -> dict:
+        '''
+        Метод загрузки нескольких pdd файлов одного полёта по описателю.
+        Файлы распаковываются параллельно в workers потоков, таблицы
+        каждого АДР объединяются в порядке списка filepaths (для папки -
+        в порядке имён), время продолжается через границы файлов
+        (см. concat_pdd_tables).
+        Возвращает словарь {имя АДР: PddTable}.
+        report - словарь, в который записывается отчёт по файлам (files):
+        путь, число записей, пропущенные байты, неполную последнюю
+        запись, неопознанные записи, разрывы времени и время распаковки
+        в секундах, а также суммы skipped и discontinuities по всем
+        файлам и общее время загрузки (seconds).
+        progress - функция progress(filepath, done, total), вызываемая
+        после распаковки каждого файла.
+        cancel - функция без аргументов, возвращающая True, если загрузку
+        нужно прервать; проверяется после каждого файла, при отмене
+        вызывается CancelledError.
+        '''
+        def load(filepath: str) -> tuple:
+            file_report = {}
+            start = perf_counter()
+            tables = cls.load_pdd(filepath, json_data, 1, file_report, cache)
+            file_report['seconds'] = perf_counter() - start
+            return filepath, tables, file_report
+
+        start = perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = [executor.submit(load, path) for path in filepaths]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress is not None:
+                    progress(results[-1][0], len(results), len(filepaths))
+                if cancel is not None and cancel():
+                    for item in futures:
+                        item.cancel()
+                    raise CancelledError
+
+        # по сырым тикам порядок файлов не определить: счётчик мог
+        # переполниться или сброситься между файлами
+        order = {filepath: number for number, filepath in enumerate(filepaths)}
+        results.sort(key=lambda result: order[result[0]])
+        names = [adr['adr_name'] for adr in json_data]
+        tables = {
+            name: cls.concat_pdd_tables(
+                [result[1][name] for result in results], workers
+            )
+            for name in dict.fromkeys(names)
+        } if results else {}
+
+        if report is not None:
+            report['files'] = [
+                {
+                    'filepath': filepath,
+                    'records': sum(
+                        len(table) for table in file_tables.values()
+                    ),
+                    'skipped': file_report['skipped'],
+                    'truncated': file_report['truncated'],
+                    'unmatched': file_report['unmatched'],
+                    'discontinuities': sum(
+                        file_report['discontinuities'].values()
+                    ),
+                    'seconds': file_report['seconds']
+                }
+                for filepath, file_tables, file_report in results
+            ]
+            report['skipped'] = sum(
+                item['skipped'] for item in report['files']
+            )
+            report['discontinuities'] = {
+                name: len(table.discontinuities)
+                for name, table in tables.items() if table.discontinuities
+            }
+            report['seconds'] = perf_counter() - start
+        return tables
+
+    @classmethod
+    def concat_pdd_tables(cls, tables: list, workers: int = 1) -> PddTable:
+        '''
+        Метод объединения таблиц одного АДР частей полёта в порядке списка.
+        Время каждой части продолжает время предыдущей: состояние
+        unwrap_ticks передаётся из части в часть, переполнение или сброс
+        счётчика на границе восстанавливается, как внутри файла, и
+        добавляется в разрывы. Столбцы объединённой таблицы
+        распаковываются заново по запросу в workers потоках.
+        '''
+        ticks, discontinuities = [], []
+        rows, state = 0, None
+        for table in tables:
+            part = table.raw_column('time').astype(np.int64)
+            items = list(table.discontinuities)
+            part_state = table.time_state
+            if len(part) and state is not None:
+                # первый тик части не исправлен, то есть равен исходному
+                first, boundary, _ = cls.unwrap_ticks(part[:1], state)
+                shift = int(first[0]) - int(part[0])
+                part = part + shift
+                items = boundary + items
+                if part_state is not None:
+                    part_state = (
+                        part_state[0], part_state[1] + shift, part_state[2]
+                    )
+            if part_state is not None:
+                state = part_state
+            ticks.append(part)
+            discontinuities.extend(
+                {**item, 'row': item['row'] + rows} for item in items
+            )
+            rows += len(part)
+        return PddTable(
+            tables[0].plan,
+            RecordWords.join([table.words for table in tables]),
+            np.concatenate(ticks),
+            discontinuities,
+            state,
+            workers
+        )
+
+    @classmethod
+    def build_pdd_index(
+        cls,
+        filepath_pdd: str,
+        checksums,
+        step: int = PDD_INDEX_STEP
+    ) -> PddIndex:
+        '''
+        Метод построения индекса pdd файла за один проход частями.
+        В индекс попадает каждая step-я запись каждой контрольной суммы
+        с восстановленными (монотонными) тиками времени.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        size, mtime_ns = PddIndex.get_stat(filepath_pdd)
+        parts = cls.get_record_parts(filepath_pdd, checksums)[0]
+        segments = []
+        counters, offsets, ticks, states = {}, {}, {}, {}
+        for part in parts:
+            if not len(part):
+                continue
+            part_offset = part.offset
+            segments.append((part_offset, part_offset + part.nbytes))
+            for start in range(0, len(part), PDD_STREAM_CHUNK):
+                chunk = part[start:start + PDD_STREAM_CHUNK]
+                partition = cls.get_checksum_partition(chunk)
+                chunk_ticks = cls.get_tick_list(chunk)
+                for checksum, indexes in partition.items():
+                    unwrapped, _, states[checksum] = cls.unwrap_ticks(
+                        chunk_ticks[indexes], states.get(checksum)
+                    )
+                    counter = counters.get(checksum, 0)
+                    counters[checksum] = counter + len(indexes)
+                    sampled = slice(-counter % step, None, step)
+                    offsets.setdefault(checksum, []).append(
+                        part_offset + (start + indexes[sampled]) * itemsize
+                    )
+                    ticks.setdefault(checksum, []).append(unwrapped[sampled])
+        entries = {
+            checksum: (
+                np.concatenate(offsets[checksum]).astype(np.int64),
+                np.concatenate(ticks[checksum])
+            )
+            for checksum in offsets
+        }
+        return PddIndex(
+            size,
+            mtime_ns,
+            step,
+            np.array(segments, dtype=np.int64).reshape(-1, 2),
+            entries
+        )
+
+    @classmethod
+    def get_pdd_index(cls, filepath_pdd: str, checksums) -> PddIndex:
+        '''
+        Метод получения индекса pdd файла: загрузка файла индекса,
+        а если его нет или он устарел - построение и сохранение.
+        '''
+        index = PddIndex.load(filepath_pdd)
+        if index is None:
+            index = cls.build_pdd_index(filepath_pdd, checksums)
+            index.save(filepath_pdd)
+        return index
+
+    @staticmethod
+    def get_index_records(
+        filepath_pdd: str,
+        index: PddIndex,
+        begin: int,
+        end: int
+    ) -> np.ndarray:
+        '''
+        Метод получения записей диапазона байт [begin, end) файла
+        по выровненным участкам индекса.
+        '''
+        itemsize = PDD_RECORD_DTYPE.itemsize
+        parts = []
+        for segment_begin, segment_end in index.segments:
+            low, high = max(begin, segment_begin), min(end, segment_end)
+            if high <= low:
+                continue
+            parts.append(np.memmap(
+                filepath_pdd,
+                dtype=PDD_RECORD_DTYPE,
+                mode='r',
+                offset=int(low),
+                shape=(int(high - low) // itemsize,)
+            ))
+        if not parts:
+            return np.empty(0, dtype=PDD_RECORD_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    @classmethod
+    def load_pdd_interval(
+        cls,
+        filepath_pdd: str,
+        json_data: list,
+        start: float,
+        stop: float
+    ) -> dict:
+        '''
+        Метод загрузки записей pdd файла со временем от start до stop.
+        Диапазон байт каждого АДР находится по индексу файла, читаются
+        и распаковываются только записи этого диапазона.
+        Возвращает словарь {имя АДР: PddTable}.
+        '''
+        plans = cls.catalogue.get_plans(json_data)
+        index = cls.get_pdd_index(
+            filepath_pdd, [plan.checksum for plan in plans]
+        )
+        result = {}
+        for plan in plans:
+            begin, end, anchor = index.get_byte_range(
+                plan.checksum, plan.time_koef, start, stop
+            )
+            records = cls.get_index_records(filepath_pdd, index, begin, end)
+            indexes = np.flatnonzero(records['cs'] == plan.checksum)
+            ticks, discontinuities, _ = cls.unwrap_ticks(
+                cls.get_tick_list(records, indexes)
+            )
+            if anchor is not None and len(ticks):
+                # время продолжается от записи индекса, с которой начат
+                # диапазон
+                ticks += anchor - ticks[0]
+            time = ticks * plan.time_koef
+            inside = np.flatnonzero((time >= start) & (time <= stop))
+            table = PddTable(
+                plan,
+                RecordWords([records['values'].T], [indexes]),
+                ticks,
+                discontinuities
+            )
+            result[plan.name] = table.take_rows(inside)
+        return result
+
+    @classmethod
+    def append_pdd(cls, filepath_pdd: str, tables: dict, offset: int) -> tuple:
+        '''
+        Метод дописывания в таблицы АДР записей, появившихся в pdd файле
+        после смещения offset.
+        Возвращает новое смещение и словарь {имя АДР: число новых записей}.
+        '''
+        unpacked_data_list = cls.get_unpacked_data_list(filepath_pdd, offset)
+        if not len(unpacked_data_list):
+            return offset, {}
+        partition = cls.get_checksum_partition(unpacked_data_list)
+        counts = {}
+        for adr_name, table in tables.items():
+            if not isinstance(table, PddTable):
+                continue
+            if table.plan.checksum not in partition:
+                continue
+            data_list = unpacked_data_list[partition[table.plan.checksum]]
+            ticks, discontinuities, state = cls.unwrap_ticks(
+                cls.get_tick_list(data_list), table.time_state
+            )
+            table.append(data_list['values'], ticks, discontinuities, state)
+            counts[adr_name] = len(data_list)
+        return offset + unpacked_data_list.nbytes, counts
+
+    @classmethod
+    def iter_pdd(
+        cls,
+        filepath_pdd: str,
+        json_data: list,
+        chunk_size: int = PDD_STREAM_CHUNK
+    ):
+        '''
+        Генератор потоковой распаковки pdd файла.
+        Файл обрабатывается частями по chunk_size записей, для каждой
+        части возвращаются пары (имя АДР, DataFrame) в порядке описателя.
+        Потребление памяти ограничено размером части, а не файла.
+        '''
+        plans = cls.catalogue.get_plans(json_data)
+        parts = cls.get_record_parts(
+            filepath_pdd, [plan.checksum for plan in plans]
+        )[0]
 
-        return result_dict
+        # состояние восстановления времени каждого АДР между частями
+        states = {}
+        for unpacked_data_list in parts:
+            for start in range(0, len(unpacked_data_list), chunk_size):
+                chunk = unpacked_data_list[start:start + chunk_size]
+                partition = cls.get_checksum_partition(chunk)
+                for number, plan in enumerate(plans):
+                    if plan.checksum not in partition:
+                        continue
+                    data_list = chunk[partition[plan.checksum]]
+                    df_dict = {}
+                    df_dict['time'], states[number], _ = cls.get_time_axis(
+                        plan.time_koef, data_list, states.get(number)
+                    )
+                    df_dict.update(plan.decode(data_list['values']))
+                    yield plan.name, pd.DataFrame(df_dict)
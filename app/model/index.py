@@ -0,0 +1,136 @@
+import os
+import uuid
+
+import numpy as np
+
+
+class PddIndex(object):
+    '''
+    Разреженный индекс записей pdd файла, хранится рядом с файлом.
+    Для каждой контрольной суммы хранится смещение каждой step-й записи
+    и её восстановленное (монотонное) время в тиках, а также выровненные
+    участки файла, поэтому интервал времени АДР находится двоичным
+    поиском без распаковки.
+    Индекс действителен, пока не изменились размер и время изменения
+    pdd файла.
+    '''
+
+    suffix = '.idx'
+    version = 1
+
+    def __init__(
+        self,
+        size: int,
+        mtime_ns: int,
+        step: int,
+        segments: np.ndarray,
+        entries: dict
+    ) -> None:
+        '''__init__
+
+        Args:
+            size (int): размер pdd файла
+            mtime_ns (int): время изменения pdd файла
+            step (int): шаг записей индекса
+            segments (np.ndarray): участки файла (начало, конец) в байтах
+            entries (dict): контрольная сумма -> (смещения, тики)
+        '''
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.step = step
+        self.segments = segments
+        self.entries = entries
+
+    @classmethod
+    def get_path(cls, filepath: str) -> str:
+        return filepath + cls.suffix
+
+    @staticmethod
+    def get_stat(filepath: str) -> tuple:
+        stat = os.stat(filepath)
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_actual(self, filepath: str) -> bool:
+        return self.get_stat(filepath) == (self.size, self.mtime_ns)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'PddIndex | None':
+        '''
+        Загрузка индекса pdd файла filepath.
+        Возвращает None, если индекса нет или он устарел.
+        '''
+        try:
+            with np.load(cls.get_path(filepath), allow_pickle=False) as file:
+                version, size, mtime_ns, step = file['meta'].tolist()
+                entries = {
+                    int(checksum): (
+                        file[f'offsets_{checksum}'],
+                        file[f'ticks_{checksum}']
+                    )
+                    for checksum in file['checksums']
+                }
+                index = cls(size, mtime_ns, step, file['segments'], entries)
+        except (OSError, ValueError, KeyError):
+            return None
+        if version != cls.version or not index.is_actual(filepath):
+            return None
+        return index
+
+    def save(self, filepath: str) -> None:
+        '''
+        Запись индекса рядом с pdd файлом.
+        Если папка файла недоступна для записи, индекс не сохраняется.
+        '''
+        path = self.get_path(filepath)
+        arrays = {
+            'meta': np.array(
+                [self.version, self.size, self.mtime_ns, self.step],
+                dtype=np.int64
+            ),
+            'segments': self.segments,
+            'checksums': np.array(list(self.entries), dtype=np.uint16),
+        }
+        for checksum, (offsets, ticks) in self.entries.items():
+            arrays[f'offsets_{checksum}'] = offsets
+            arrays[f'ticks_{checksum}'] = ticks
+        temp_path = f'{path}.{uuid.uuid4().hex}'
+        try:
+            with open(temp_path, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get_byte_range(
+        self,
+        checksum: int,
+        time_koef: float,
+        start: float,
+        stop: float
+    ) -> tuple:
+        '''
+        Диапазон байт файла, в котором лежат все записи контрольной
+        суммы checksum со временем от start до stop (в секундах).
+        Диапазон выровнен по записям и может захватывать лишние записи
+        на краях (не больше step записей суммы с каждой стороны).
+        Возвращает начало, конец диапазона и восстановленные тики первой
+        записи суммы в диапазоне, если диапазон начинается с записи
+        индекса, иначе None (диапазон с начала файла).
+        '''
+        if not len(self.segments):
+            return 0, 0, None
+        begin, end = int(self.segments[0][0]), int(self.segments[-1][1])
+        if checksum not in self.entries:
+            return begin, begin, None
+        offsets, ticks = self.entries[checksum]
+        times = ticks * time_koef
+        lower = np.searchsorted(times, start, side='left') - 1
+        upper = np.searchsorted(times, stop, side='right')
+        anchor = None
+        if lower >= 0:
+            begin = int(offsets[lower])
+            anchor = int(ticks[lower])
+        if upper < len(offsets):
+            end = int(offsets[upper])
+        return begin, max(begin, end), anchor
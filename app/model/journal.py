@@ -0,0 +1,208 @@
+import json as js
+import os
+import struct
+import threading
+import uuid
+import zlib
+
+import numpy as np
+
+from .session import Session
+
+
+class SessionJournal(object):
+    '''
+    Журнал изменений данных сеанса (только дописывается).
+    Начинается с контрольной точки - файла сеанса, который был последним
+    сохранён или открыт, - и хранит по порядку изменения данных после неё
+    как вызовы методов контроллера с аргументами: загрузки файлов, новые
+    таблицы и столбцы, переименования, удаления, смещения времени.
+    Аргументы-массивы хранятся сжатыми блоками, как столбцы файла сеанса.
+    Каждая запись сразу сбрасывается на диск, поэтому после аварийного
+    завершения данные восстанавливаются загрузкой контрольной точки и
+    повтором записей, а стоимость журнала зависит только от размера
+    изменений. Недописанная при сбое последняя запись отбрасывается
+    по длине и CRC32.
+    '''
+
+    magic = b'DARPJRN1'
+    version = 1
+    # длина и CRC32 записи
+    entry = struct.Struct('<II')
+    # длина json части заголовка и записи
+    length = struct.Struct('<I')
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self) -> tuple:
+        '''
+        Чтение журнала и открытие его для дописывания.
+        Возвращает путь к контрольной точке (None, если журнал начат
+        без данных) и список записей [(метод, аргументы)].
+        Если файла контрольной точки нет или он изменён после начала
+        журнала, вызывается ValueError. Контрольная точка проверяется
+        по её каталогу (Session.get_state), поэтому оборванное
+        сохранение в неё не делает журнал недействительным.
+        '''
+        try:
+            with open(self.filepath, 'rb') as file:
+                header, entries, end = self.read(file)
+        except (OSError, ValueError):
+            self.reset()
+            return None, []
+        self._file = open(self.filepath, 'r+b')
+        # недописанная запись отрезается
+        self._file.truncate(end)
+        self._file.seek(end)
+        checkpoint = header['checkpoint']
+        if checkpoint is not None and entries:
+            try:
+                stat = Session.get_state(checkpoint)
+            except (OSError, ValueError):
+                stat = None
+            if stat is None or list(stat) != header['stat']:
+                raise ValueError(
+                    f'Файл сеанса {checkpoint} изменён после начала журнала'
+                )
+        return checkpoint, entries
+
+    @classmethod
+    def read(cls, file) -> tuple:
+        '''
+        Чтение заголовка и целых записей журнала.
+        Возвращает заголовок, записи и смещение конца последней целой
+        записи.
+        '''
+        if file.read(len(cls.magic)) != cls.magic:
+            raise ValueError(f'Файл {file.name} не журнал')
+        header = js.loads(cls.read_part(file).decode('utf8'))
+        if header.get('version') != cls.version:
+            raise ValueError(
+                f'Неподдерживаемая версия журнала: {header.get("version")}'
+            )
+        entries = []
+        end = file.tell()
+        while True:
+            head = file.read(cls.entry.size)
+            if len(head) < cls.entry.size:
+                break
+            size, crc = cls.entry.unpack(head)
+            payload = file.read(size)
+            if len(payload) != size or zlib.crc32(payload) != crc:
+                break
+            entries.append(cls.decode_entry(payload))
+            end = file.tell()
+        return header, entries, end
+
+    @classmethod
+    def read_part(cls, file) -> bytes:
+        head = file.read(cls.length.size)
+        if len(head) < cls.length.size:
+            raise ValueError(f'Файл {file.name} повреждён')
+        (size,) = cls.length.unpack(head)
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError(f'Файл {file.name} повреждён')
+        return data
+
+    def reset(self, checkpoint: str | None = None) -> None:
+        '''
+        Начало журнала заново от контрольной точки checkpoint - файла
+        сеанса с текущими данными (None - без данных).
+        '''
+        header = {
+            'version': self.version,
+            'checkpoint': None,
+            'stat': None
+        }
+        if checkpoint is not None:
+            header['checkpoint'] = os.path.abspath(checkpoint)
+            header['stat'] = list(Session.get_state(checkpoint))
+        data = js.dumps(header, ensure_ascii=False).encode('utf8')
+        dirpath = os.path.dirname(self.filepath)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        with self._lock:
+            self.close_file()
+            temp_path = f'{self.filepath}.{uuid.uuid4().hex}'
+            try:
+                with open(temp_path, 'wb') as file:
+                    file.write(self.magic)
+                    file.write(self.length.pack(len(data)))
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, self.filepath)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._file = open(self.filepath, 'r+b')
+            self._file.seek(0, os.SEEK_END)
+
+    def append(self, method: str, args: dict) -> None:
+        '''
+        Запись вызова метода контроллера method с аргументами args.
+        '''
+        payload = self.encode_entry(method, args)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(
+                self.entry.pack(len(payload), zlib.crc32(payload))
+            )
+            self._file.write(payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @classmethod
+    def encode_entry(cls, method: str, args: dict) -> bytes:
+        '''
+        Запись: длина json части, json с методом, аргументами и описанием
+        блоков аргументов-массивов, блоки массивов.
+        '''
+        values, arrays, blocks = {}, {}, []
+        offset = 0
+        for name, value in args.items():
+            if not isinstance(value, np.ndarray):
+                values[name] = value
+                continue
+            block, meta = Session.encode_block(value)
+            arrays[name] = {**meta, 'offset': offset, 'size': len(block)}
+            blocks.append(block)
+            offset += len(block)
+        data = js.dumps(
+            {'method': method, 'args': values, 'arrays': arrays},
+            ensure_ascii=False
+        ).encode('utf8')
+        return b''.join([cls.length.pack(len(data)), data, *blocks])
+
+    @classmethod
+    def decode_entry(cls, payload: bytes) -> tuple:
+        (size,) = cls.length.unpack_from(payload)
+        start = cls.length.size + size
+        entry = js.loads(payload[cls.length.size:start].decode('utf8'))
+        args = entry['args']
+        for name, meta in entry['arrays'].items():
+            offset = start + meta['offset']
+            args[name] = Session.decode_block(
+                payload[offset:offset + meta['size']], {**meta, 'name': name}
+            )
+        return entry['method'], args
+
+    def close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        '''
+        Закрытие журнала при штатном завершении, файл журнала удаляется.
+        '''
+        with self._lock:
+            self.close_file()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
@@ -0,0 +1,514 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+import numpy as np
+
+from .table import LazyTable, SparseColumn
+
+# Наименьшее число записей части при параллельной распаковке полей
+DECODE_PART_ROWS = 1 << 16
+
+
+class AdrPlan(object):
+    '''
+    Скомпилированный план распаковки одного АДР из json описателя.
+    Описатель разбирается один раз: позиции, маски, сдвиги, типы и
+    коэффициенты всех полей собираются в массивы, а распаковка
+    выполняется пакетно над двумерным массивом слов.
+    '''
+
+    types = {
+        'int16': np.int16,
+        'int8': np.int8,
+        'pre': np.int8,
+        'uint16': np.uint16,
+    }
+
+    def __init__(self, adr: dict) -> None:
+        self.name: str = adr['adr_name']
+        self.checksum: int = int(adr['checksum'], base=16)
+        self.time_koef: float = adr['time_koef']
+        self.byteswap: bool = adr['bytes_swap']
+        self.names: list = []
+        # имя столбца -> номер поля (при повторе имени действует последнее)
+        self.field_index: dict = {}
+        # условия групп: (номер слова, маска, сдвиг)
+        self.conditions: list = []
+        # для полей групп: номер поля -> (номер условия, значение)
+        self.field_conditions: dict = {}
+
+        positions, masks, shifts, koefs, types = [], [], [], [], []
+        for field, condition in self._iter_fields(adr['fields']):
+            mask, shift = self.get_mask_shift_from_field(field['size'])
+            if condition is not None:
+                self.field_conditions[len(self.names)] = condition
+            self.field_index[field['name']] = len(self.names)
+            self.names.append(field['name'])
+            positions.append(field['position'])
+            masks.append(mask << shift)
+            shifts.append(shift)
+            koefs.append(field['koef'])
+            types.append(self.types.get(field['type'], np.uint16))
+
+        self.positions = np.array(positions, dtype=np.intp)
+        self.masks = np.array(masks, dtype=np.uint16)
+        self.shifts = np.array(shifts, dtype=np.uint16)
+        self.koefs = np.array(koefs, dtype=np.float64)
+        self.dtypes: list = types
+        # поля во всё слово, которые можно отдавать без копирования
+        self.views = np.array([
+            mask == 0xffff and shift == 0 and self.byteswap
+            and dtype in (np.int16, np.uint16)
+            and number not in self.field_conditions
+            for number, (mask, shift, dtype)
+            in enumerate(zip(masks, shifts, types))
+        ], dtype=bool)
+
+    @staticmethod
+    def get_mask_shift_from_field(size: str) -> tuple:
+        # получаем маску и смещение для побитового сравнения и получения данных
+        start, stop = [int(i) for i in size.split(':')]
+        number_mask = int('1' * (stop - start + 1), 2)
+        shift = start
+        return number_mask, shift
+
+    def _iter_fields(self, fields: list):
+        '''
+        Обход полей описателя с раскрытием групп.
+        Для полей групп с условием возвращается номер условия и его значение.
+        '''
+        for field in fields:
+            if not field.get('group'):
+                yield field, None
+                continue
+            if isinstance(field['fields'], list):
+                for item in field['fields']:
+                    yield item, None
+                continue
+            mask, shift = self.get_mask_shift_from_field(
+                field['condition_bit']
+            )
+            self.conditions.append((field['condition_byte'], mask, shift))
+            condition_index = len(self.conditions) - 1
+            for condition, items in field['fields'].items():
+                for item in items:
+                    yield item, (condition_index, int(condition))
+
+    @staticmethod
+    def get_words(values: np.ndarray) -> np.ndarray:
+        '''
+        Перевод слов записей формы (n, 16) в массив (16, n) в порядке байт
+        машины. Каждый столбец слов переставляется один раз.
+        '''
+        return np.ascontiguousarray(values.T, dtype=np.uint16)
+
+    def decode(self, values: np.ndarray) -> dict:
+        '''
+        Распаковка всех полей АДР.
+        values - слова записей формы (n, 16).
+        Возвращает словарь {имя поля: столбец} в порядке описателя.
+        '''
+        columns = self.decode_words(self.get_words(values))
+        result = {}
+        for name, column in zip(self.names, columns):
+            result[name] = column
+        return result
+
+    def decode_words(self, words: np.ndarray, fields=None) -> list:
+        '''
+        Пакетная распаковка полей из массива слов формы (16, n)
+        в физических величинах (с учётом koef).
+        fields - номера полей, по умолчанию все поля описателя.
+        Возвращает список столбцов в порядке fields.
+        '''
+        if fields is None:
+            fields = range(len(self.names))
+        columns = self.decode_raw(words, fields)
+        for number, i in enumerate(fields):
+            if isinstance(columns[number], SparseColumn):
+                columns[number] = columns[number].dense()
+            if self.koefs[i] != 1:
+                columns[number] = (
+                    columns[number].astype(np.float64) * self.koefs[i]
+                )
+        return columns
+
+    def decode_raw(
+        self,
+        words: np.ndarray,
+        fields=None,
+        workers: int = 1
+    ) -> list:
+        '''
+        Пакетная распаковка полей в их собственном типе (int8, int16,
+        uint16) без применения koef.
+        Поля во всё слово без перестановки байт и условия возвращаются
+        представлениями (view) строк слов: для слов в памяти без
+        копирования, для записей файла копируется только эта строка,
+        поля групп с условием - разреженными столбцами только из строк,
+        где условие выполняется.
+        При workers > 1 остальные поля распаковываются частями записей
+        (не меньше DECODE_PART_ROWS) в workers потоках, операции numpy
+        над частями отпускают GIL.
+        '''
+        if fields is None:
+            fields = range(len(self.names))
+        fields = np.asarray(fields, dtype=np.intp)
+        words = RecordWords.join([words])
+        columns = [None] * len(fields)
+        views = self.views[fields]
+        numbers = np.flatnonzero(views)
+        rows = words.get_rows(self.positions[fields[numbers]])
+        for number, row in zip(numbers, rows):
+            columns[number] = row.view(self.dtypes[fields[number]])
+        numbers = np.flatnonzero(~views)
+        if not len(numbers):
+            return columns
+
+        decoded = fields[numbers]
+        parts = min(workers, words.shape[1] // DECODE_PART_ROWS)
+        if parts <= 1:
+            results = self.decode_fields(words, decoded)
+        else:
+            bounds = np.linspace(0, words.shape[1], parts + 1).astype(int)
+            with ThreadPoolExecutor(max_workers=parts) as executor:
+                chunks = list(executor.map(
+                    lambda start, stop: self.decode_fields(
+                        words[:, start:stop], decoded
+                    ),
+                    bounds[:-1],
+                    bounds[1:]
+                ))
+            results = [self.join_parts(list(items)) for items in zip(*chunks)]
+        for number, column in zip(numbers, results):
+            columns[number] = column
+        return columns
+
+    def decode_fields(self, words: np.ndarray, decoded: np.ndarray) -> list:
+        '''
+        Распаковка полей decoded (не представлений) из массива слов.
+        '''
+        raw = words[self.positions[decoded]]
+        raw &= self.masks[decoded, None]
+        raw >>= self.shifts[decoded, None]
+        if not self.byteswap:
+            raw.byteswap(inplace=True)
+
+        columns = [None] * len(decoded)
+        for dtype in dict.fromkeys(self.dtypes[i] for i in decoded):
+            indexes = np.array([
+                index for index, i in enumerate(decoded)
+                if self.dtypes[i] is dtype
+            ], dtype=np.intp)
+            for index, column in zip(indexes, raw[indexes].astype(dtype)):
+                columns[index] = column
+
+        condition_rows = {}
+        for index, i in enumerate(decoded):
+            condition = self.field_conditions.get(int(i))
+            if condition is None:
+                continue
+            if condition not in condition_rows:
+                condition_rows[condition] = np.flatnonzero(
+                    self.get_condition_mask(words, *condition)
+                )
+            rows = condition_rows[condition]
+            columns[index] = SparseColumn(
+                rows, columns[index][rows], words.shape[1]
+            )
+        return columns
+
+    @staticmethod
+    def join_parts(parts: list):
+        '''
+        Объединение столбца, распакованного частями записей.
+        '''
+        if isinstance(parts[0], SparseColumn):
+            return reduce(SparseColumn.append, parts)
+        return np.concatenate(parts)
+
+    def get_condition_mask(
+        self,
+        words: np.ndarray,
+        condition_index: int,
+        value: int
+    ) -> np.ndarray:
+        byte, mask, shift = self.conditions[condition_index]
+        return ((words[byte] & (mask << shift)) >> shift) == value
+
+
+class RecordWords(object):
+    '''
+    Слова записей АДР формы (16, n) без копирования записей в память.
+    Хранятся части - массивы слов формы (16, m) (представления записей
+    отображённого файла, np.memmap, или уже готовые слова) - и номера
+    записей АДР в каждой части (массив или срез). Строки слов (одно
+    слово всех записей) выбираются из частей только при распаковке
+    столбцов и приводятся к uint16 в порядке байт машины.
+    '''
+
+    def __init__(self, parts: list, indexes: list) -> None:
+        '''__init__
+
+        Args:
+            parts (list): массивы слов частей формы (16, m)
+            indexes (list): номера записей АДР в каждой части
+        '''
+        self.parts = parts
+        self.indexes = indexes
+        self.lengths = [
+            len(range(part.shape[1])[index]) if isinstance(index, slice)
+            else len(index)
+            for part, index in zip(parts, indexes)
+        ]
+        self.shape = (parts[0].shape[0], sum(self.lengths))
+
+    @classmethod
+    def join(cls, items: list) -> 'RecordWords':
+        '''
+        Объединение слов по записям. Массивы слов (16, m) становятся
+        частями целиком, подряд идущие массивы в памяти склеиваются,
+        чтобы при частом дописывании число частей не росло.
+        '''
+        parts, indexes = [], []
+        for item in items:
+            if not isinstance(item, cls):
+                item = cls([item], [slice(None)])
+            for part, index in zip(item.parts, item.indexes):
+                if (
+                    parts and cls.is_memory_part(parts[-1], indexes[-1])
+                    and cls.is_memory_part(part, index)
+                ):
+                    parts[-1] = np.concatenate((parts[-1], part), axis=1)
+                    continue
+                parts.append(part)
+                indexes.append(index)
+        return cls(parts, indexes)
+
+    @staticmethod
+    def is_memory_part(part: np.ndarray, index) -> bool:
+        return (
+            not isinstance(part, np.memmap) and part.dtype == np.uint16
+            and isinstance(index, slice) and index == slice(None)
+        )
+
+    def take(self, positions: np.ndarray) -> np.ndarray:
+        '''
+        Строки слов positions всех записей формы (len(positions), n).
+        '''
+        positions = np.asarray(positions, dtype=np.intp)
+        unique, inverse = np.unique(positions, return_inverse=True)
+        result = np.empty((len(positions), self.shape[1]), dtype=np.uint16)
+        start = 0
+        for part, index, length in zip(self.parts, self.indexes, self.lengths):
+            if len(unique) == 1:
+                rows = part[unique[0]][index][None]
+            else:
+                # записи АДР выбираются целиком (слова записи лежат
+                # рядом), затем из них берутся нужные строки
+                rows = part[:, index][unique]
+            result[:, start:start + length] = rows[inverse]
+            start += length
+        return result
+
+    def take_rows(self, rows) -> 'RecordWords':
+        '''
+        Слова только записей rows (срез или возрастающие номера).
+        '''
+        rows = np.arange(self.shape[1])[rows] if isinstance(
+            rows, slice
+        ) else np.asarray(rows)
+        bounds = np.cumsum([0] + self.lengths)
+        parts, indexes = [], []
+        for number, (part, index) in enumerate(zip(self.parts, self.indexes)):
+            low, high = np.searchsorted(rows, bounds[number:number + 2])
+            # пустая выборка сохраняет одну часть ради формы слов
+            if high > low or not parts and number == len(self.parts) - 1:
+                if isinstance(index, slice):
+                    index = np.arange(part.shape[1])[index]
+                parts.append(part)
+                indexes.append(index[rows[low:high] - bounds[number]])
+        return RecordWords(parts, indexes)
+
+    def get_rows(self, positions) -> list:
+        '''
+        Строки слов positions списком. Готовые слова (в том числе
+        из кэша) отдаются представлениями без копирования, слова записей
+        файла выбираются одним вызовом take.
+        '''
+        part, index = self.parts[0], self.indexes[0]
+        if (
+            len(self.parts) == 1 and isinstance(index, slice)
+            and index == slice(None) and part.dtype == np.uint16
+        ):
+            return [part[position] for position in positions]
+        return list(self.take(positions))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.take_rows(key[1])
+        if np.ndim(key) == 0:
+            return self.get_rows([key])[0]
+        return self.take(key)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        words = self.take(np.arange(self.shape[0]))
+        return words if dtype is None else words.astype(dtype)
+
+
+class PddTable(LazyTable):
+    '''
+    Ленивая таблица одного АДР pdd файла.
+    Хранит слова записей АДР (RecordWords, записи отображённого файла
+    в память не копируются) и план распаковки, поле распаковывается
+    из слов только при первом обращении к столбцу (график, выгрузка,
+    расчёт) и дальше берётся из кэша.
+    Время хранится целыми тиками с масштабом time_koef, секунды
+    вычисляются при обращении к столбцу time.
+    '''
+
+    def __init__(
+        self,
+        plan: AdrPlan,
+        words: np.ndarray,
+        ticks: np.ndarray,
+        discontinuities: list | None = None,
+        time_state: tuple | None = None,
+        workers: int = 1
+    ) -> None:
+        '''__init__
+
+        Args:
+            plan (AdrPlan): план распаковки АДР
+            words (np.ndarray | RecordWords): слова записей АДР формы
+                (16, n)
+            ticks (np.ndarray): монотонные тики времени записей
+            discontinuities (list | None): разрывы счётчика времени
+            time_state (tuple | None): исходные и восстановленные тики
+                последней записи и последний шаг для продолжения времени
+                при дописывании
+            workers (int): число потоков распаковки столбцов
+        '''
+        self.plan = plan
+        self.workers = workers
+        self.words = RecordWords.join([words])
+        self.discontinuities: list = list(discontinuities or [])
+        self.time_state = time_state
+        super().__init__(
+            plan.field_index,
+            len(ticks),
+            {'time': self.get_compact_ticks(ticks)}
+        )
+        # время всегда идёт первым столбцом
+        self._loaders = {'time': None, **plan.field_index}
+        # столбцы хранятся в собственном типе поля, koef применяется
+        # при обращении к физическим значениям
+        self._scales = {
+            name: float(plan.koefs[i])
+            for name, i in plan.field_index.items() if plan.koefs[i] != 1
+        }
+        self._scales['time'] = plan.time_koef
+
+    @staticmethod
+    def get_compact_ticks(ticks: np.ndarray) -> np.ndarray:
+        '''
+        Тики времени в 32 битах, если они помещаются (без переполнений
+        счётчика), иначе в 64 битах.
+        '''
+        ticks = np.asarray(ticks)
+        if not len(ticks) or (ticks.min() >= 0 and ticks.max() < 1 << 32):
+            return ticks.astype(np.uint32)
+        return ticks.astype(np.int64)
+
+    def _load_many(self, specs: list) -> list:
+        return self.plan.decode_raw(self.words, specs, self.workers)
+
+    def take_rows(self, rows) -> 'PddTable':
+        table = super().take_rows(rows)
+        table.words = self.words[:, rows]
+        if isinstance(rows, slice):
+            start, stop, _ = rows.indices(len(self))
+            table.discontinuities = [
+                {**item, 'row': item['row'] - start}
+                for item in self.discontinuities
+                if start <= item['row'] < stop
+            ]
+        else:
+            positions = np.searchsorted(
+                rows, [item['row'] for item in self.discontinuities]
+            )
+            table.discontinuities = [
+                {**item, 'row': int(position)}
+                for item, position in zip(self.discontinuities, positions)
+                if position < len(rows) and rows[position] == item['row']
+            ]
+        return table
+
+    def __deepcopy__(self, memo) -> 'PddTable':
+        table = super().__deepcopy__(memo)
+        table.discontinuities = [dict(item) for item in self.discontinuities]
+        return table
+
+    def get_time_offset(self) -> float:
+        '''
+        Смещение заданного вручную времени в секундах от времени по тикам,
+        по последней записи таблицы.
+        '''
+        if self.time_state is None or not self._length:
+            return 0.0
+        return (
+            float(self._cache['time'][-1])
+            - self.time_state[1] * self.plan.time_koef
+        )
+
+    def append(
+        self,
+        values: np.ndarray,
+        ticks: np.ndarray,
+        discontinuities: list | None = None,
+        time_state: tuple | None = None
+    ) -> None:
+        '''
+        Дописывание новых записей АДР с тиками времени ticks.
+        Уже распакованные столбцы дополняются распаковкой только
+        новых записей, остальные распакуются при обращении.
+        Номера строк разрывов времени отсчитываются от начала новых записей.
+        '''
+        words = self.plan.get_words(values)
+        decoded = [
+            name for name, spec in self._loaders.items()
+            if spec is not None and name in self._cache
+        ]
+        columns = self.plan.decode_raw(
+            words, [self._loaders[name] for name in decoded], self.workers
+        )
+        self.words = RecordWords.join([self.words, words])
+        for name, column in zip(decoded, columns):
+            if isinstance(column, SparseColumn):
+                self._cache[name] = self._cache[name].append(column)
+            else:
+                self._cache[name] = np.concatenate((self._cache[name], column))
+        for name, spec in self._loaders.items():
+            if spec is not None or name not in self._cache:
+                continue
+            if name == 'time':
+                new_values = self.get_compact_ticks(ticks)
+                if 'time' not in self._scales:
+                    # время задано вручную в секундах (например, смещено),
+                    # новые записи продолжают его с тем же смещением
+                    new_values = (
+                        ticks * self.plan.time_koef + self.get_time_offset()
+                    )
+            else:
+                # столбцы, заданные вручную, дополняются пропусками
+                new_values = np.full(len(ticks), np.nan)
+            self._cache[name] = np.concatenate((self._cache[name], new_values))
+        self.discontinuities = self.discontinuities + [
+            {**item, 'row': item['row'] + self._length}
+            for item in discontinuities or []
+        ]
+        if time_state is not None:
+            self.time_state = time_state
+        self._length += len(ticks)
+        # сохранённые блоки столбцов короче таблицы
+        self._blocks = {}
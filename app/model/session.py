@@ -0,0 +1,838 @@
+import bz2
+import json as js
+import lzma
+import os
+import pickle
+import struct
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .table import LazyTable, SparseColumn
+
+
+class SessionTable(LazyTable):
+    '''
+    Ленивая таблица АДР из файла сеанса.
+    Описание загрузки столбца - запись его блока в каталоге файла, блок
+    столбца читается и распаковывается только при первом обращении.
+    Несколько столбцов распаковываются параллельно в workers потоках.
+    Таблица из части строк (take_rows) хранит номера строк файла rows
+    и выбирает их из столбцов при загрузке.
+    '''
+
+    def __init__(
+        self,
+        filepath: str,
+        meta: dict,
+        stat: tuple | None = None,
+        workers: int = 1
+    ) -> None:
+        '''__init__
+
+        Args:
+            filepath (str): путь к файлу сеанса
+            meta (dict): запись АДР в каталоге файла
+            stat (tuple | None): состояние файла (Session.get_state)
+            workers (int): число потоков распаковки столбцов
+        '''
+        self.workers = workers
+        # строки столбцов файла (range или номера), None - все строки
+        self.rows = None
+        blocks = {column['name']: column for column in meta['columns']}
+        super().__init__(blocks, meta['length'])
+        self._scales = {
+            column['name']: column['scale']
+            for column in meta['columns'] if 'scale' in column
+        }
+        self.set_blocks(filepath, stat or Session.get_state(filepath), blocks)
+
+    def _load_many(self, specs: list) -> list:
+        with Session.open_source(self) as file:
+            blocks = [Session.read_block(file, spec) for spec in specs]
+        columns = Session.decode_blocks(blocks, specs, self.workers)
+        if self.rows is None:
+            return columns
+        rows = self.rows
+        if isinstance(rows, range):
+            rows = slice(rows.start, rows.stop, rows.step)
+        return [
+            values.take_rows(rows)
+            if isinstance(values, SparseColumn) else values[rows]
+            for values in columns
+        ]
+
+    def set_blocks(self, filepath: str, stat: tuple, blocks: dict) -> None:
+        # столбцы, заданные заново, выгружаются из памяти и дальше
+        # читаются из файла
+        for name, meta in blocks.items():
+            if self._loaders[name] is None:
+                self._cache.pop(name, None)
+            self._loaders[name] = meta
+        # записанные блоки содержат ровно строки таблицы
+        self.rows = None
+        super().set_blocks(filepath, stat, blocks)
+
+    def take_rows(self, rows) -> 'LazyTable':
+        # незагруженные столбцы остаются незагруженными, выбранные
+        # строки берутся из столбцов файла при загрузке
+        table = super().take_rows(rows)
+        file_rows = range(self._length) if self.rows is None else self.rows
+        if isinstance(rows, slice) or not isinstance(file_rows, range):
+            table.rows = file_rows[rows]
+        else:
+            table.rows = file_rows.start + file_rows.step * np.asarray(rows)
+        return table
+
+
+class Session(object):
+    '''
+    Колоночный файл сеанса (данные Control.data).
+    Каждый столбец каждого АДР хранится отдельным сжатым блоком,
+    после блоков идёт каталог в json: категории, АДР, число строк,
+    столбцы с типом, размером в памяти, положением, способом сжатия и
+    контрольной суммой (CRC32) блока, а также данные полёта
+    (FLIGHT_DATA). Разреженный столбец хранится двумя блоками - номерами
+    строк и значениями, в каталоге он отмечен записью sparse с длиной,
+    значением пропусков и блоком номеров строк. В конце файла - смещение,
+    размер и CRC32 каталога и сигнатура, поэтому каталог читается без
+    чтения блоков, а столбцы загружаются при первом обращении.
+    При повторном сохранении изменённые столбцы и новый каталог
+    дописываются в конец файла. Блоки и каталог сбрасываются на диск
+    до записи сигнатуры, поэтому при сбое во время сохранения в файле
+    остаётся целым каталог предыдущего сохранения, и он находится
+    просмотром файла с конца.
+    Блоки независимы, поэтому сжимаются и распаковываются параллельно
+    в потоках (zlib, lzma и bz2 отпускают GIL).
+    Файлы прежнего формата (pickle в gzip) определяются по сигнатуре.
+    '''
+
+    magic = b'DARPSES1'
+    version = 1
+    # смещение, размер и CRC32 каталога, сигнатура
+    trailer = struct.Struct('<QQI8s')
+    trailer_magic = b'DARPCAT1'
+    # размер части файла, читаемой за раз при поиске целого каталога
+    scan_size = 1 << 20
+    # способ сжатия -> (сжатие с уровнем, распаковка)
+    codecs = {
+        'zlib': (zlib.compress, zlib.decompress),
+        'lzma': (
+            lambda data, level: lzma.compress(data, preset=level),
+            lzma.decompress
+        ),
+        'bz2': (
+            lambda data, level: bz2.compress(data, max(level, 1)),
+            bz2.decompress
+        ),
+    }
+    codec = 'zlib'
+    compress_level = 1
+    # наибольшее число значений столбца для словарного кодирования
+    dictionary_size = 256
+    # число первых значений столбца, по сжатию которых выбираются фильтры
+    sample_size = 8192
+    # доля неиспользуемых блоков, после которой файл переписывается целиком
+    max_garbage = 0.5
+    # категория со сведениями о полёте, хранится в каталоге
+    flight_data = 'FLIGHT_DATA'
+
+    @classmethod
+    def open_source(cls, frame: LazyTable):
+        '''
+        Открытие файла сеанса с блоками таблицы frame. Если файл с тех
+        пор перезаписан (не этой таблицей), положения блоков уже неверны.
+        '''
+        filepath = frame.get_session()[0]
+        if not cls.has_source(frame):
+            raise ValueError(f'Файл сеанса {filepath} был изменён')
+        return open(filepath, 'rb')
+
+    @classmethod
+    def has_source(cls, frame: LazyTable) -> bool:
+        '''
+        Файл сеанса с блоками таблицы frame не изменился.
+        '''
+        session = frame.get_session()
+        if session is None:
+            return False
+        try:
+            return cls.get_state(session[0]) == session[1]
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def is_bound(frame: LazyTable, filepath: str, stat: tuple) -> bool:
+        '''
+        Блоки таблицы frame лежат в файле filepath в состоянии stat.
+        '''
+        session = frame.get_session()
+        return (
+            session is not None and session[1] == stat
+            and os.path.samefile(session[0], filepath)
+        )
+
+    @classmethod
+    def is_session(cls, filepath: str) -> bool:
+        with open(filepath, 'rb') as file:
+            return file.read(len(cls.magic)) == cls.magic
+
+    @classmethod
+    def read_catalogue(cls, filepath: str) -> dict:
+        '''
+        Чтение каталога файла сеанса без чтения блоков столбцов.
+        Если окончание файла оборвано (сбой при дописывании), файл
+        просматривается с конца до последнего каталога с верной
+        контрольной суммой - каталога предыдущего сохранения.
+        '''
+        with open(filepath, 'rb') as file:
+            data, _ = cls.find_catalogue(file)
+        catalogue = js.loads(data.decode('utf8'))
+        if catalogue.get('version') != cls.version:
+            raise ValueError(
+                f'Неподдерживаемая версия файла: {catalogue.get("version")}'
+            )
+        return catalogue
+
+    @classmethod
+    def get_state(cls, filepath: str) -> tuple:
+        '''
+        Состояние файла сеанса: смещение, размер и CRC32 каталога,
+        который читает read_catalogue. В отличие от размера и времени
+        изменения файла оно не меняется, если дописывание оборвалось.
+        Для файла прежнего формата - размер и время изменения.
+        '''
+        with open(filepath, 'rb') as file:
+            if file.read(len(cls.magic)) != cls.magic:
+                stat = os.fstat(file.fileno())
+                return stat.st_size, stat.st_mtime_ns
+            return cls.find_catalogue(file)[1]
+
+    @classmethod
+    def find_catalogue(cls, file) -> tuple:
+        '''
+        Поиск последнего целого каталога файла сеанса.
+        Возвращает байты каталога и его смещение, размер и CRC32.
+        '''
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        found = cls.read_trailer(file, size)
+        if found is None:
+            for end in cls.find_trailers(file, size):
+                found = cls.read_trailer(file, end)
+                if found is not None:
+                    break
+        if found is None:
+            raise ValueError(f'Файл {file.name} повреждён')
+        return found
+
+    @classmethod
+    def read_trailer(cls, file, end: int) -> tuple | None:
+        '''
+        Байты и положение каталога, окончание которого заканчивается
+        в положении end, или None, если окончание или каталог не целы.
+        '''
+        if end < len(cls.magic) + cls.trailer.size:
+            return None
+        file.seek(end - cls.trailer.size)
+        offset, length, crc, magic = cls.trailer.unpack(
+            file.read(cls.trailer.size)
+        )
+        if magic != cls.trailer_magic or offset < len(cls.magic) or (
+            offset + length > end - cls.trailer.size
+        ):
+            return None
+        file.seek(offset)
+        data = file.read(length)
+        if zlib.crc32(data) != crc:
+            return None
+        return data, (offset, length, crc)
+
+    @classmethod
+    def find_trailers(cls, file, size: int):
+        '''
+        Положения концов сигнатур окончаний каталога в файле от конца
+        к началу. Файл читается частями по scan_size.
+        '''
+        overlap = len(cls.trailer_magic) - 1
+        end, tail = size, b''
+        while end > 0:
+            start = max(end - cls.scan_size, 0)
+            file.seek(start)
+            data = file.read(end - start) + tail
+            position = len(data)
+            while True:
+                position = data.rfind(cls.trailer_magic, 0, position)
+                if position < 0:
+                    break
+                yield start + position + len(cls.trailer_magic)
+            end, tail = start, data[:overlap]
+
+    @classmethod
+    def load(cls, filepath: str, workers: int = 1) -> dict:
+        '''
+        Открытие файла сеанса.
+        Возвращает словарь {категория: {АДР: SessionTable}}, столбцы
+        загружаются при обращении, несколько столбцов - в workers потоках.
+        '''
+        catalogue = cls.read_catalogue(filepath)
+        stat = cls.get_state(filepath)
+        data = {}
+        for category, adrs in catalogue['categories'].items():
+            data[category] = {
+                adr: cls.get_table(filepath, meta, stat, workers)
+                for adr, meta in adrs.items()
+            }
+        if catalogue.get('flight_data') is not None:
+            data[cls.flight_data] = catalogue['flight_data']
+        return data
+
+    @classmethod
+    def get_table(
+        cls,
+        filepath: str,
+        meta: dict,
+        stat: tuple | None = None,
+        workers: int = 1
+    ):
+        table = SessionTable(filepath, meta, stat, workers)
+        if 'index' not in meta:
+            return table
+        # таблица с собственным индексом строк собирается сразу
+        with open(filepath, 'rb') as file:
+            index = cls.read_column(file, meta['index'])
+        frame = table.to_frame()
+        frame.index = pd.Index(index)
+        return frame
+
+    @classmethod
+    def read_block(cls, file, meta: dict):
+        '''
+        Чтение сжатого блока столбца с проверкой контрольной суммы.
+        Для разреженного столбца - пара блоков (номера строк, значения).
+        '''
+        if 'sparse' in meta:
+            return (
+                cls.read_block(file, cls.get_index_meta(meta)),
+                cls.read_block(file, cls.get_values_meta(meta))
+            )
+        file.seek(meta['offset'])
+        block = file.read(meta['size'])
+        if len(block) != meta['size'] or zlib.crc32(block) != meta['crc']:
+            raise ValueError(
+                f'Блок столбца {meta["name"]} в файле {file.name} повреждён'
+            )
+        return block
+
+    @classmethod
+    def read_column(cls, file, meta: dict):
+        return cls.decode_block(cls.read_block(file, meta), meta)
+
+    @staticmethod
+    def get_index_meta(meta: dict) -> dict:
+        '''
+        Запись блока номеров строк разреженного столбца.
+        '''
+        return {**meta['sparse']['index'], 'name': meta['name']}
+
+    @staticmethod
+    def get_values_meta(meta: dict) -> dict:
+        '''
+        Запись блока значений разреженного столбца.
+        '''
+        return {key: value for key, value in meta.items() if key != 'sparse'}
+
+    @classmethod
+    def get_size(cls, meta: dict) -> int:
+        '''
+        Размер в файле всех блоков столбца.
+        '''
+        if 'sparse' in meta:
+            return meta['size'] + meta['sparse']['index']['size']
+        return meta['size']
+
+    @classmethod
+    def decode_block(cls, block, meta: dict):
+        if 'sparse' in meta:
+            return SparseColumn(
+                cls.decode_block(block[0], cls.get_index_meta(meta)),
+                cls.decode_block(block[1], cls.get_values_meta(meta)),
+                meta['sparse']['length'],
+                meta['sparse']['fill']
+            )
+        values = cls.decode_column(
+            cls.codecs[meta['codec']][1](block), meta
+        )
+        if meta['encoding'] == 'raw' and values.nbytes != meta['nbytes']:
+            raise ValueError(f'Блок столбца {meta["name"]} повреждён')
+        return values
+
+    @classmethod
+    def decode_blocks(
+        cls,
+        blocks: list,
+        metas: list,
+        workers: int = 1
+    ) -> list:
+        '''
+        Распаковка блоков столбцов, при workers > 1 - параллельно.
+        '''
+        if workers <= 1 or len(blocks) <= 1:
+            return list(map(cls.decode_block, blocks, metas))
+        with ThreadPoolExecutor(min(workers, len(blocks))) as executor:
+            return list(executor.map(cls.decode_block, blocks, metas))
+
+    @classmethod
+    def encode_column(cls, values) -> tuple:
+        '''
+        Перевод столбца в байты: числовые массивы numpy хранятся
+        как есть с предварительными фильтрами (encode_raw), остальные
+        (строки, типы pandas) - в pickle.
+        Возвращает байты и описание столбца.
+        '''
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'biufcmM':
+            values = np.ascontiguousarray(values)
+            if not values.dtype.isnative:
+                values = values.astype(values.dtype.newbyteorder('='))
+            data, filters = cls.encode_raw(values)
+            meta = {
+                'dtype': values.dtype.str,
+                'encoding': 'raw',
+                'nbytes': values.nbytes
+            }
+            meta.update(filters)
+            return data, meta
+        data = pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+        return data, {
+            'dtype': str(values.dtype),
+            'encoding': 'pickle',
+            'nbytes': int(getattr(values, 'nbytes', len(data)))
+        }
+
+    @classmethod
+    def decode_column(cls, data: bytes, meta: dict):
+        if meta['encoding'] != 'raw':
+            return pickle.loads(data)
+        dtype = np.dtype(meta['dtype'])
+        if not meta.get('filters'):
+            return np.frombuffer(data, dtype=dtype)
+        values = cls.decode_raw(data, dtype, meta).view(dtype)
+        # как и без фильтров, столбец из файла только для чтения
+        values.flags.writeable = False
+        return values
+
+    @classmethod
+    def encode_raw(cls, values: np.ndarray) -> tuple:
+        '''
+        Предварительные фильтры числового столбца перед сжатием.
+        Фильтры работают с целыми без знака того же размера, что и
+        значения (битовое представление), поэтому точно обратимы и для
+        вещественных столбцов, включая NaN:
+        - dictionary - столбец с малым числом различных значений
+          (флаги, битовые поля) хранится словарём значений и кодами uint8;
+        - delta - монотонный столбец (время, счётчики) хранится первым
+          значением и разностями соседних значений;
+        - shuffle - байты значений группируются по номеру байта, чтобы
+          старшие (почти одинаковые) байты шли подряд.
+        shuffle и delta помогают не всем столбцам (повторы целых значений
+        после shuffle сжимаются хуже), поэтому они выбираются по сжатию
+        начала столбца.
+        Возвращает байты и описание фильтров для каталога.
+        '''
+        if values.itemsize not in (2, 4, 8) or len(values) < 2:
+            return values.tobytes(), {}
+        words = values.view(np.dtype(f'u{values.itemsize}'))
+        dictionary = cls.get_dictionary(words)
+        if dictionary is not None:
+            uniques, codes = dictionary
+            return uniques.tobytes() + codes.tobytes(), {
+                'filters': ['dictionary'],
+                'dictionary': len(uniques)
+            }
+        candidates = [[], ['shuffle']]
+        if values.dtype.kind in 'iufmM' and (
+            np.all(values[1:] >= values[:-1])
+            or np.all(values[1:] <= values[:-1])
+        ):
+            candidates += [['delta'], ['delta', 'shuffle']]
+        sample = words[:cls.sample_size]
+        filters = min(candidates, key=lambda filters: len(zlib.compress(
+            cls.apply_filters(sample, filters), 1
+        )))
+        if not filters:
+            return values.tobytes(), {}
+        return cls.apply_filters(words, filters), {'filters': filters}
+
+    @staticmethod
+    def apply_filters(words: np.ndarray, filters: list) -> bytes:
+        if 'delta' in filters:
+            delta = np.empty_like(words)
+            delta[:1] = words[:1]
+            np.subtract(words[1:], words[:-1], out=delta[1:])
+            words = delta
+        if 'shuffle' in filters:
+            return words.view(np.uint8).reshape(-1, words.itemsize).T.tobytes()
+        return words.tobytes()
+
+    @staticmethod
+    def decode_raw(data: bytes, dtype: np.dtype, meta: dict) -> np.ndarray:
+        '''
+        Обратные фильтры encode_raw. Возвращает целые без знака размера
+        dtype.
+        '''
+        word = np.dtype(f'u{dtype.itemsize}')
+        filters = meta['filters']
+        if 'dictionary' in filters:
+            count = meta['dictionary']
+            uniques = np.frombuffer(data, dtype=word, count=count)
+            codes = np.frombuffer(
+                data, dtype=np.uint8, offset=count * word.itemsize
+            )
+            return uniques[codes]
+        if 'shuffle' in filters:
+            words = np.frombuffer(data, dtype=np.uint8).reshape(
+                word.itemsize, -1
+            ).T.copy().view(word).reshape(-1)
+        else:
+            words = np.frombuffer(data, dtype=word).copy()
+        if 'delta' in filters:
+            # сумма в целых без знака восстанавливает значения по модулю
+            np.cumsum(words, dtype=word, out=words)
+        return words
+
+    @classmethod
+    def get_dictionary(cls, words: np.ndarray) -> tuple | None:
+        '''
+        Словарь значений и коды uint8, если различных значений
+        не больше dictionary_size и заметно меньше, чем строк.
+        '''
+        limit = min(cls.dictionary_size, len(words) // 2)
+        if words.itemsize <= 2:
+            uniques = np.flatnonzero(np.bincount(words)).astype(words.dtype)
+            if len(uniques) > limit:
+                return None
+            table = np.zeros(1 << 8 * words.itemsize, dtype=np.uint8)
+            table[uniques] = np.arange(len(uniques))
+            return uniques, table[words]
+        # проверка по выборке, чтобы не сортировать заведомо разные значения
+        sample = words[::max(1, len(words) // 4096)]
+        if len(np.unique(sample)) > limit:
+            return None
+        uniques = np.unique(words)
+        if len(uniques) > limit:
+            return None
+        return uniques, np.searchsorted(uniques, words).astype(np.uint8)
+
+    @classmethod
+    def write(
+        cls,
+        data: dict,
+        filepath: str,
+        codec: str | None = None,
+        level: int | None = None,
+        workers: int = 1
+    ) -> None:
+        '''
+        Запись данных сеанса в файл.
+        Если filepath - файл сеанса, из которого загружены таблицы data,
+        в конец файла дописываются только изменённые и новые столбцы и
+        новый каталог, блоки неизменённых столбцов остаются на месте.
+        Когда неиспользуемые блоки занимают больше половины файла, файл
+        переписывается целиком: запись идёт во временный файл, который
+        затем заменяет filepath, незагруженные столбцы переносятся
+        сжатыми блоками без распаковки.
+        Столбцы сжимаются способом codec с уровнем level в workers
+        потоках, по умолчанию - zlib с уровнем 1.
+        После записи ленивые таблицы data запоминают блоки своих столбцов,
+        а DataFrame (кроме таблиц с собственным индексом строк)
+        заменяются таблицами сеанса.
+        '''
+        codec = codec or cls.codec
+        if codec not in cls.codecs:
+            raise ValueError(f'Неизвестный способ сжатия: {codec}')
+        encode = partial(
+            cls.encode_block,
+            codec=codec,
+            level=cls.compress_level if level is None else level
+        )
+        if cls.can_append(data, filepath):
+            catalogue = cls.append(data, filepath, encode, workers)
+        else:
+            catalogue = cls.rewrite(data, filepath, encode, workers)
+        cls.bind(data, filepath, catalogue, workers)
+
+    @classmethod
+    def can_append(cls, data: dict, filepath: str) -> bool:
+        '''
+        Можно ли дописать файл filepath: это файл сеанса, из которого
+        загружены таблицы data, и неиспользуемые блоки занимают в нём
+        не больше max_garbage его размера.
+        '''
+        try:
+            if not cls.is_session(filepath):
+                return False
+            cls.read_catalogue(filepath)
+            stat = cls.get_state(filepath)
+            size = os.path.getsize(filepath)
+        except (OSError, ValueError):
+            return False
+        used = 0
+        for category, adrs in data.items():
+            if category == cls.flight_data:
+                continue
+            for frame in adrs.values():
+                if not isinstance(frame, LazyTable):
+                    continue
+                if not cls.is_bound(frame, filepath, stat):
+                    continue
+                used += sum(
+                    cls.get_size(meta)
+                    for meta in map(frame.get_block_meta, frame.columns)
+                    if meta is not None
+                )
+        return used > 0 and size - used <= cls.max_garbage * size
+
+    @classmethod
+    def append(cls, data: dict, filepath: str, encode, workers: int) -> dict:
+        target = (filepath, cls.get_state(filepath))
+        with open(filepath, 'r+b') as file:
+            size = file.seek(0, os.SEEK_END)
+            try:
+                catalogue = cls.write_data(file, data, encode, workers, target)
+                # без изменений файл не дописывается
+                if file.tell() != size or (
+                    catalogue != cls.read_catalogue(filepath)
+                ):
+                    cls.write_catalogue(file, catalogue)
+            except BaseException:
+                # файл возвращается к прежнему каталогу, таблицы
+                # по-прежнему читают из него свои блоки
+                file.truncate(size)
+                raise
+        return catalogue
+
+    @classmethod
+    def rewrite(cls, data: dict, filepath: str, encode, workers: int) -> dict:
+        temp_path = f'{filepath}.{uuid.uuid4().hex}'
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(cls.magic)
+                catalogue = cls.write_data(file, data, encode, workers)
+                cls.write_catalogue(file, catalogue)
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return catalogue
+
+    @classmethod
+    def write_data(
+        cls,
+        file,
+        data: dict,
+        encode,
+        workers: int = 1,
+        target: tuple | None = None
+    ) -> dict:
+        '''
+        Запись таблиц data в file. Возвращает каталог.
+        Столбцы всех таблиц сжимаются функцией encode параллельно
+        в workers потоках, блоки записываются по порядку по мере
+        готовности.
+        target - путь и состояние дописываемого файла: блоки столбцов,
+        уже сохранённые в этом файле, не переписываются.
+        '''
+        catalogue = {
+            'version': cls.version,
+            'categories': {},
+            'flight_data': data.get(cls.flight_data)
+        }
+        executor = ThreadPoolExecutor(max(workers, 1))
+        try:
+            submit = partial(executor.submit, encode)
+            tables = []
+            for category, adrs in data.items():
+                if category == cls.flight_data:
+                    continue
+                catalogue['categories'][category] = {}
+                for adr, frame in adrs.items():
+                    jobs = cls.get_jobs(frame, submit, target)
+                    tables.append((category, adr, frame, jobs))
+            for category, adr, frame, jobs in tables:
+                catalogue['categories'][category][adr] = cls.write_table(
+                    file, frame, *jobs
+                )
+        finally:
+            executor.shutdown(cancel_futures=True)
+        return catalogue
+
+    @classmethod
+    def get_jobs(cls, frame, submit, target: tuple | None = None) -> tuple:
+        '''
+        Задания записи столбцов таблицы: список (имя, вид, значение) и
+        задание сжатия индекса строк (или None).
+        Вид 'keep' - блок уже в дописываемом файле (значение - запись
+        блока), 'copy' - блок переносится из файла сеанса таблицы без
+        распаковки, 'encode' - значение - задание сжатия (Future).
+        '''
+        if not isinstance(frame, LazyTable):
+            columns = []
+            for name, series in frame.items():
+                if isinstance(series.dtype, np.dtype):
+                    values = series.to_numpy()
+                else:
+                    values = series.array
+                columns.append((name, 'encode', submit(values)))
+            index = None
+            if not frame.index.equals(pd.RangeIndex(len(frame))):
+                index = submit(frame.index.to_numpy())
+            return columns, index
+        if target is not None and cls.is_bound(frame, *target):
+            kind = 'keep'
+        elif cls.has_source(frame):
+            kind = 'copy'
+        else:
+            # файл сеанса изменён, столбцы записываются из памяти
+            kind = None
+        encoded = [
+            name for name in frame.columns
+            if kind is None or frame.get_block_meta(name) is None
+        ]
+        # незагруженные столбцы распаковываются только для сжатия
+        # и не остаются в памяти таблицы
+        values = dict(zip(encoded, frame.read_values(encoded)))
+        columns = []
+        for name in frame.columns:
+            if name in values:
+                columns.append((name, 'encode', submit(
+                    values[name], frame.get_scale(name)
+                )))
+            else:
+                columns.append((name, kind, frame.get_block_meta(name)))
+        return columns, None
+
+    @classmethod
+    def write_table(cls, file, frame, columns: list, index=None) -> dict:
+        '''
+        Запись блоков столбцов таблицы по заданиям get_jobs.
+        Возвращает запись каталога АДР.
+        '''
+        source = None
+        result = []
+        try:
+            for name, kind, value in columns:
+                if kind == 'keep':
+                    result.append({**value, 'name': name})
+                    continue
+                if kind == 'copy':
+                    if source is None:
+                        source = cls.open_source(frame)
+                    block, meta = cls.read_block(source, value), value
+                else:
+                    block, meta = value.result()
+                result.append(cls.write_block(file, name, block, meta))
+        finally:
+            if source is not None:
+                source.close()
+        entry = {'length': len(frame), 'columns': result}
+        if index is not None:
+            entry['index'] = cls.write_block(file, 'index', *index.result())
+        return entry
+
+    @classmethod
+    def bind(
+        cls,
+        data: dict,
+        filepath: str,
+        catalogue: dict,
+        workers: int = 1
+    ) -> None:
+        '''
+        Привязка таблиц data к записанному файлу сеанса.
+        '''
+        stat = cls.get_state(filepath)
+        for category, adrs in catalogue['categories'].items():
+            for adr, meta in adrs.items():
+                frame = data[category][adr]
+                if isinstance(frame, LazyTable):
+                    frame.set_blocks(filepath, stat, {
+                        column['name']: column for column in meta['columns']
+                    })
+                elif 'index' not in meta:
+                    data[category][adr] = SessionTable(
+                        filepath, meta, stat, workers
+                    )
+
+    @classmethod
+    def encode_block(
+        cls,
+        values,
+        scale: float | None = None,
+        codec: str = 'zlib',
+        level: int = 1
+    ) -> tuple:
+        '''
+        Сжатие столбца в блок. Возвращает блок и описание столбца
+        со способом сжатия и контрольной суммой блока.
+        Разреженный столбец сжимается в пару блоков (номера строк,
+        значения) без построения плотного вида.
+        '''
+        if isinstance(values, SparseColumn):
+            index, index_meta = cls.encode_block(
+                values.index, codec=codec, level=level
+            )
+            block, meta = cls.encode_block(values.values, scale, codec, level)
+            meta['sparse'] = {
+                'length': values.length,
+                'fill': np.asarray(values.fill).tolist(),
+                'index': index_meta
+            }
+            return (index, block), meta
+        data, meta = cls.encode_column(values)
+        block = cls.codecs[codec][0](data, level)
+        meta['codec'] = codec
+        meta['crc'] = zlib.crc32(block)
+        if scale is not None:
+            meta['scale'] = scale
+        return block, meta
+
+    @classmethod
+    def write_block(cls, file, name: str, block, meta: dict) -> dict:
+        if 'sparse' in meta:
+            index, block = block
+            index_meta = cls.write_block(
+                file, name, index, meta['sparse']['index']
+            )
+            index_meta.pop('name')
+            meta = {**meta, 'sparse': {**meta['sparse'], 'index': index_meta}}
+        meta = {
+            **meta, 'name': name, 'offset': file.tell(), 'size': len(block)
+        }
+        file.write(block)
+        return meta
+
+    @classmethod
+    def write_catalogue(cls, file, catalogue: dict) -> None:
+        '''
+        Запись каталога и окончания файла. Блоки и каталог сбрасываются
+        на диск раньше окончания, поэтому целое окончание всегда
+        указывает на записанные данные.
+        '''
+        offset = file.tell()
+        data = js.dumps(catalogue, ensure_ascii=False).encode('utf8')
+        file.write(data)
+        cls.sync(file)
+        file.write(cls.trailer.pack(
+            offset, len(data), zlib.crc32(data), cls.trailer_magic
+        ))
+        cls.sync(file)
+
+    @staticmethod
+    def sync(file) -> None:
+        file.flush()
+        os.fsync(file.fileno())
@@ -0,0 +1,540 @@
+import numpy as np
+import pandas as pd
+
+# Свойства и методы DataFrame, которые LazyTable берёт у полного DataFrame
+# (все столбцы загружаются); остальные атрибуты DataFrame недоступны
+FRAME_ATTRIBUTES = frozenset({
+    'apply', 'astype', 'describe', 'dtypes', 'head', 'iloc', 'info',
+    'items', 'iterrows', 'itertuples', 'loc', 'max', 'mean', 'memory_usage',
+    'min', 'reset_index', 'sort_values', 'tail', 'to_csv', 'to_dict',
+    'to_excel', 'to_numpy', 'values',
+})
+
+
+class SparseColumn(object):
+    '''
+    Разреженный столбец: номера строк, в которых есть значения, и сами
+    значения. Плотный вид строится только по запросу, остальные строки
+    в нём заполняются fill.
+    '''
+
+    def __init__(
+        self,
+        index: np.ndarray,
+        values: np.ndarray,
+        length: int,
+        fill=0
+    ) -> None:
+        '''__init__
+
+        Args:
+            index (np.ndarray): возрастающие номера строк со значениями
+            values (np.ndarray): значения в этих строках
+            length (int): полная длина столбца
+            fill: значение остальных строк плотного вида
+        '''
+        self.index = index
+        self.values = values
+        self.length = length
+        self.fill = fill
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def nbytes(self) -> int:
+        return self.index.nbytes + self.values.nbytes
+
+    def dense(self) -> np.ndarray:
+        result = np.full(self.length, self.fill, dtype=self.values.dtype)
+        result[self.index] = self.values
+        return result
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        '''
+        Значения в строках rows, которые должны входить в index.
+        '''
+        return self.values[np.searchsorted(self.index, rows)]
+
+    def take_rows(self, rows) -> 'SparseColumn':
+        '''
+        Столбец только из строк rows (срез или возрастающие номера).
+        '''
+        if isinstance(rows, slice):
+            start, stop, _ = rows.indices(self.length)
+            inside = (self.index >= start) & (self.index < stop)
+            return SparseColumn(
+                self.index[inside] - start,
+                self.values[inside],
+                max(stop - start, 0),
+                self.fill
+            )
+        positions = np.searchsorted(rows, self.index)
+        inside = positions < len(rows)
+        inside[inside] = rows[positions[inside]] == self.index[inside]
+        return SparseColumn(
+            positions[inside], self.values[inside], len(rows), self.fill
+        )
+
+    def append(self, other: 'SparseColumn') -> 'SparseColumn':
+        return SparseColumn(
+            np.concatenate((self.index, other.index + self.length)),
+            np.concatenate((self.values, other.values)),
+            self.length + other.length,
+            self.fill
+        )
+
+
+class LazyTable(object):
+    '''
+    Таблица с ленивой загрузкой столбцов.
+    Для каждого столбца хранится описание загрузки, сам столбец
+    вычисляется при первом обращении и кэшируется.
+    Основные операции DataFrame (выбор столбцов, dropna, rename, drop,
+    merge) выполняются только над нужными столбцами, для методов из
+    FRAME_ATTRIBUTES собирается полный DataFrame.
+    Столбец может храниться в исходном целом типе с коэффициентом
+    масштаба, тогда физические значения вычисляются при обращении.
+    Разреженные столбцы (SparseColumn) в DataFrame дают плотный вид,
+    а в dropna строки без значений считаются пропусками.
+    Для столбцов, сохранённых в файл сеанса, хранятся записи их блоков;
+    при изменении столбца запись удаляется, и при следующем сохранении
+    столбец записывается заново.
+    '''
+
+    def __init__(
+        self,
+        loaders: dict,
+        length: int,
+        data: dict | None = None
+    ) -> None:
+        '''__init__
+
+        Args:
+            loaders (dict): имя столбца -> описание загрузки
+            length (int): количество строк
+            data (dict | None): уже загруженные столбцы
+        '''
+        self._loaders: dict = dict(loaders)
+        self._cache: dict = {}
+        # имя столбца -> коэффициент перевода хранимых значений в физические
+        self._scales: dict = {}
+        self._length: int = length
+        # имя столбца -> запись блока в файле сеанса, путь и состояние файла
+        self._blocks: dict = {}
+        self._session: tuple | None = None
+        for name, values in (data or {}).items():
+            self._loaders.setdefault(name, None)
+            self._cache[name] = values
+
+    def _load_many(self, specs: list) -> list:
+        '''
+        Загрузка нескольких столбцов по их описаниям.
+        По умолчанию описание - функция без аргументов.
+        '''
+        return [spec() for spec in specs]
+
+    def load(self, names) -> None:
+        '''
+        Загрузка в кэш ещё не загруженных столбцов одним вызовом.
+        '''
+        missing = [
+            name for name in dict.fromkeys(names)
+            if name not in self._cache
+        ]
+        for name in missing:
+            if name not in self._loaders:
+                raise KeyError(name)
+        if not missing:
+            return
+        specs = [self._loaders[name] for name in missing]
+        for name, values in zip(missing, self._load_many(specs)):
+            self._cache[name] = values
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._cache
+
+    def raw_column(self, name: str) -> np.ndarray:
+        '''
+        Получение хранимых значений столбца (без коэффициента масштаба)
+        с загрузкой при первом обращении.
+        '''
+        self.load([name])
+        values = self._cache[name]
+        if isinstance(values, SparseColumn):
+            return values.dense()
+        return values
+
+    def read_values(self, names: list) -> list:
+        '''
+        Хранимые значения столбцов names без записи в кэш: загруженные
+        столбцы берутся из кэша, остальные распаковываются одним вызовом
+        и не запоминаются.
+        '''
+        missing = [name for name in names if name not in self._cache]
+        loaded = {}
+        if missing:
+            specs = [self._loaders[name] for name in missing]
+            loaded = dict(zip(missing, self._load_many(specs)))
+        return [
+            self._cache[name] if name in self._cache else loaded[name]
+            for name in names
+        ]
+
+    def get_rows(self, name: str) -> np.ndarray | None:
+        '''
+        Номера строк, в которых у разреженного столбца есть значения,
+        для плотного столбца - None.
+        '''
+        self.load([name])
+        values = self._cache[name]
+        if isinstance(values, SparseColumn):
+            return values.index
+        return None
+
+    def take(self, name: str, rows: np.ndarray) -> np.ndarray:
+        '''
+        Физические значения столбца в строках rows.
+        '''
+        self.load([name])
+        values = self._cache[name]
+        if isinstance(values, SparseColumn):
+            values = values.take(rows)
+        else:
+            values = values[rows]
+        scale = self._scales.get(name)
+        if scale is None:
+            return values
+        return values.astype(np.float64) * scale
+
+    def column(self, name: str) -> np.ndarray:
+        '''
+        Получение физических значений столбца.
+        Коэффициент масштаба применяется при каждом обращении, в кэше
+        остаются значения в компактном хранимом типе.
+        '''
+        values = self.raw_column(name)
+        scale = self._scales.get(name)
+        if scale is None:
+            return values
+        return values.astype(np.float64) * scale
+
+    def get_scale(self, name: str) -> float | None:
+        '''
+        Коэффициент масштаба столбца или None, если столбец хранится
+        в физических величинах.
+        '''
+        return self._scales.get(name)
+
+    def get_block_meta(self, name: str) -> dict | None:
+        '''
+        Запись блока столбца в файле сеанса или None, если столбец
+        не сохранён или изменён после сохранения.
+        '''
+        return self._blocks.get(name)
+
+    def get_nbytes(self, name: str) -> int | None:
+        '''
+        Размер хранимых значений столбца в памяти без его загрузки:
+        у загруженного столбца - по значениям, у сохранённого в файл
+        сеанса - по записи блока, иначе None.
+        '''
+        if name in self._cache:
+            return int(getattr(self._cache[name], 'nbytes', 0))
+        meta = self._blocks.get(name)
+        if meta is None:
+            return None
+        if 'sparse' in meta:
+            return meta['nbytes'] + meta['sparse']['index']['nbytes']
+        return meta['nbytes']
+
+    def get_session(self) -> tuple | None:
+        '''
+        Путь и состояние (Session.get_state) файла сеанса, в котором
+        лежат блоки столбцов.
+        '''
+        return self._session
+
+    def set_blocks(self, filepath: str, stat: tuple, blocks: dict) -> None:
+        '''
+        Запоминание блоков столбцов после сохранения в файл сеанса.
+        '''
+        self._session = (filepath, stat)
+        self._blocks = dict(blocks)
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(list(self._loaders))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, name) -> bool:
+        return name in self._loaders
+
+    def __iter__(self):
+        return iter(list(self._loaders))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return pd.Series(self.column(key), name=key)
+        if isinstance(key, (list, tuple, pd.Index)):
+            return self.to_frame(list(key))
+        return self.to_frame()[key]
+
+    def __setitem__(self, name: str, value) -> None:
+        if isinstance(value, pd.Series):
+            value = value.to_numpy()
+        value = np.asarray(value)
+        if value.ndim == 0:
+            value = np.full(self._length, value)
+        if len(value) != self._length:
+            raise ValueError(
+                f'Length of values ({len(value)}) does not match '
+                f'length of index ({self._length})'
+            )
+        # столбец, заданный заново, больше не загружается по описанию
+        self._loaders[name] = None
+        self._cache[name] = value
+        self._scales.pop(name, None)
+        self._blocks.pop(name, None)
+
+    def __delitem__(self, name: str) -> None:
+        del self._loaders[name]
+        self._cache.pop(name, None)
+        self._scales.pop(name, None)
+        self._blocks.pop(name, None)
+
+    def to_frame(
+        self,
+        columns: list | None = None,
+        rows: np.ndarray | None = None
+    ) -> pd.DataFrame:
+        '''
+        Сборка DataFrame из выбранных (или всех) столбцов.
+        rows - номера строк, по умолчанию все строки.
+        '''
+        if columns is None:
+            columns = list(self._loaders)
+        self.load(columns)
+        if rows is None:
+            frame = pd.DataFrame(
+                {name: self.column(name) for name in dict.fromkeys(columns)},
+                index=pd.RangeIndex(self._length)
+            )
+        else:
+            frame = pd.DataFrame(
+                {
+                    name: self.take(name, rows)
+                    for name in dict.fromkeys(columns)
+                },
+                index=rows
+            )
+        if len(frame.columns) != len(columns):
+            frame = frame[columns]
+        return frame
+
+    def copy(self, deep: bool = True) -> pd.DataFrame:
+        return self.to_frame()
+
+    def dropna(self, *args, subset=None, **kwargs):
+        '''
+        Удаление строк с пропусками в столбцах subset.
+        Маска строк строится только по столбцам subset и применяется
+        ко всей таблице (take_rows), остальные столбцы не загружаются.
+        '''
+        how = kwargs.get('how', 'any')
+        if (
+            subset is None or args or set(kwargs) - {'how'}
+            or how not in ('any', 'all')
+        ):
+            return self.to_frame().dropna(*args, subset=subset, **kwargs)
+        mask = np.full(self._length, how == 'any')
+        for name in dict.fromkeys(subset):
+            self.load([name])
+            values = self._cache[name]
+            if isinstance(values, SparseColumn):
+                # строки без значений в разреженном столбце - пропуски
+                present = np.zeros(self._length, dtype=bool)
+                present[values.index] = ~pd.isna(values.values)
+            else:
+                present = ~pd.isna(values)
+            if how == 'any':
+                mask &= present
+            else:
+                mask |= present
+        if mask.all():
+            return self.take_rows(slice(None))
+        return self.take_rows(np.flatnonzero(mask))
+
+    def _shallow_copy(self) -> 'LazyTable':
+        '''
+        Копия таблицы с общими данными и собственными словарями столбцов.
+        '''
+        table = object.__new__(type(self))
+        table.__dict__.update(self.__dict__)
+        table._loaders = dict(self._loaders)
+        table._cache = dict(self._cache)
+        table._scales = dict(self._scales)
+        table._blocks = dict(self._blocks)
+        return table
+
+    def take_rows(self, rows) -> 'LazyTable':
+        '''
+        Таблица только из строк rows (срез или возрастающие номера строк).
+        Незагруженные столбцы остаются незагруженными.
+        '''
+        table = self._shallow_copy()
+        table._cache = {
+            name: values.take_rows(rows)
+            if isinstance(values, SparseColumn) else values[rows]
+            for name, values in self._cache.items()
+        }
+        table._length = len(range(self._length)[rows]) if isinstance(
+            rows, slice
+        ) else len(rows)
+        table._blocks = {}
+        return table
+
+    def between(
+        self,
+        start: float,
+        stop: float,
+        column: str = 'time'
+    ) -> 'LazyTable':
+        '''
+        Таблица из строк со значением column от start до stop.
+        Для возрастающего столбца (время) границы находятся двоичным
+        поиском, и строки берутся срезом без копирования.
+        '''
+        values = self.column(column)
+        if np.all(values[1:] >= values[:-1]):
+            rows = slice(
+                int(np.searchsorted(values, start, side='left')),
+                int(np.searchsorted(values, stop, side='right'))
+            )
+        else:
+            rows = np.flatnonzero((values >= start) & (values <= stop))
+        return self.take_rows(rows)
+
+    def rename(self, columns: dict | None = None, **kwargs):
+        if columns is None or kwargs:
+            return self.to_frame().rename(columns=columns, **kwargs)
+        table = self._shallow_copy()
+        table._loaders = {
+            columns.get(name, name): spec
+            for name, spec in self._loaders.items()
+        }
+        table._cache = {
+            columns.get(name, name): values
+            for name, values in self._cache.items()
+        }
+        table._scales = {
+            columns.get(name, name): scale
+            for name, scale in self._scales.items()
+        }
+        table._blocks = {
+            columns.get(name, name): meta
+            for name, meta in self._blocks.items()
+        }
+        return table
+
+    def drop(
+        self,
+        labels=None,
+        axis=0,
+        columns=None,
+        inplace: bool = False,
+        **kwargs
+    ):
+        if columns is None and axis in (1, 'columns'):
+            columns = labels
+        if columns is None or kwargs:
+            frame = self.to_frame()
+            return frame.drop(
+                labels, axis=axis, columns=columns,
+                inplace=inplace, **kwargs
+            )
+        if isinstance(columns, str):
+            columns = [columns]
+        for name in columns:
+            if name not in self._loaders:
+                raise KeyError(f'{[name]} not found in axis')
+        table = self if inplace else self._shallow_copy()
+        for name in columns:
+            del table[name]
+        if not inplace:
+            return table
+
+    def merge(self, right, *args, **kwargs) -> pd.DataFrame:
+        if isinstance(right, LazyTable):
+            right = right.to_frame()
+        scale = self.get_scale('time')
+        if (
+            not args and kwargs.get('on') == 'time'
+            and set(kwargs) <= {'on', 'how'} and scale is not None
+        ):
+            # объединение по целым тикам времени, если время справа
+            # получено из тех же тиков
+            right_time = right['time'].to_numpy()
+            right_ticks = np.rint(right_time / scale)
+            if np.array_equal(right_ticks * scale, right_time):
+                left = self.to_frame()
+                left['time'] = self.raw_column('time').astype(np.int64)
+                result = left.merge(
+                    right.assign(time=right_ticks.astype(np.int64)), **kwargs
+                )
+                result['time'] = (
+                    result['time'].to_numpy().astype(np.float64) * scale
+                )
+                return result
+        return self.to_frame().merge(right, *args, **kwargs)
+
+    @property
+    def shape(self) -> tuple:
+        return self._length, len(self._loaders)
+
+    @property
+    def empty(self) -> bool:
+        return not self._length or not self._loaders
+
+    @property
+    def index(self) -> pd.RangeIndex:
+        return pd.RangeIndex(self._length)
+
+    def __getattr__(self, name: str):
+        # столбец по имени загружается один, методы из FRAME_ATTRIBUTES
+        # берутся у полного DataFrame
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._loaders:
+            return self[name]
+        if name in FRAME_ATTRIBUTES:
+            return getattr(self.to_frame(), name)
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
+
+    def __reduce__(self):
+        # Сохраняется (pickle) как обычный DataFrame
+        return pd.DataFrame, (self.to_frame(),)
+
+    def __copy__(self) -> 'LazyTable':
+        return self._shallow_copy()
+
+    def __deepcopy__(self, memo) -> 'LazyTable':
+        # Загруженные столбцы копируются, незагруженные остаются общими
+        # описаниями и загружаются копией отдельно
+        table = self._shallow_copy()
+        table._cache = {
+            name: SparseColumn(
+                values.index.copy(), values.values.copy(),
+                values.length, values.fill
+            ) if isinstance(values, SparseColumn) else values.copy()
+            for name, values in self._cache.items()
+        }
+        memo[id(self)] = table
+        return table
+
+    def __repr__(self) -> str:
+        return repr(self.to_frame())
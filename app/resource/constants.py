@@ -2,3 +2,5 @@ ORGANIZATION_NAME: str = 'Radiopribor'
 ORGANIZATION_DOMAIN: str = 'zrp.ru'
 APPLICATION_NAME: str = 'DARP'
 APPLICATION_VERSION: str = '0.2023.09.28'
+PDD_FOLLOW_INTERVAL: int = 1000  # мс, период опроса pdd в режиме слежения
+LOG_FILE: str = 'darp.log'  # журнал сообщений в папке данных пользователя
@@ -4,3 +4,4 @@ from .save_csv_window import SaveCsvWindow
 from .settings_window import SettingsWindow
 from .graph_on_time_window import GraphOnTimeWidget
 from .base_widget import BaseWidget
+from .task_thread import TaskThread
@@ -167,17 +167,42 @@ class Left_Menu_Tree(QTreeWidget):
                 tree_adr = QTreeWidgetItem(tree_category)
                 tree_adr.setText(0, adr_name)
                 tree_adr.setExpanded(True)
+                # размеры берутся из каталога файла сеанса, столбцы
+                # при построении дерева не загружаются
+                sizes = self.parent.controller.get_memory_sizes(adr_values)
+                tree_adr.setToolTip(0, self.get_size_text(sizes.values()))
                 for item_name in sorted(adr_values.columns):
                     if item_name in self.get_filters():
                         continue
-                    self.add_tree_item(
-                        tree_adr, item_name, len(adr_values[item_name])
+                    tree_item = self.add_tree_item(
+                        tree_adr, item_name, len(adr_values)
+                    )
+                    tree_item.setToolTip(
+                        0, self.get_size_text([sizes.get(item_name)])
                     )
         self.show()
         self.resize_columns_to_contents()
         self.parent.splitter.setSizes([90, 500])
         self.parent.update_child_windows()
 
+    def update_counts(self) -> None:
+        """
+        Обновляет количество записей у элементов дерева без его перестроения,
+        отметки чек-боксов сохраняются.
+        """
+        data = self.parent.controller.get_data()
+        for i in range(self.topLevelItemCount()):
+            tree_category = self.topLevelItem(i)
+            adrs = data.get(tree_category.text(0), {})
+            for j in range(tree_category.childCount()):
+                tree_adr = tree_category.child(j)
+                if tree_adr.text(0) not in adrs:
+                    continue
+                count = str(len(adrs[tree_adr.text(0)]))
+                for k in range(tree_adr.childCount()):
+                    tree_adr.child(k).setText(1, count)
+        self.resize_columns_to_contents()
+
     def get_filters(self) -> list:
         '''Возвращает список заголовков, которые нужно скрыть
 
@@ -186,7 +211,25 @@ class Left_Menu_Tree(QTreeWidget):
         '''
         return self.settings.value('left_menu_filters')
 
-    def add_tree_item(self, parent: QTreeWidgetItem, item_name: str, count: int) -> None:
+    @staticmethod
+    def get_size_text(sizes) -> str:
+        '''Подсказка с размером данных в памяти.
+
+        Args:
+            sizes: размеры столбцов в байтах, None - размер не известен
+
+        Returns:
+            str: текст подсказки
+        '''
+        known = [size for size in sizes if size is not None]
+        if not known:
+            return 'Размер в памяти: не загружено'
+        text = f'Размер в памяти: {sum(known) / 2 ** 20:.2f} МБ'
+        if len(known) < len(sizes):
+            text += ' (без незагруженных столбцов)'
+        return text
+
+    def add_tree_item(self, parent: QTreeWidgetItem, item_name: str, count: int) -> QTreeWidgetItem:
         """
         Добавляет новый элемент дерева с заданными именем и количеством.
 
@@ -196,7 +239,7 @@ class Left_Menu_Tree(QTreeWidget):
             - count (int): Отображаемое количество.
 
         Returns:
-            - None
+            - QTreeWidgetItem: добавленный элемент.
         """
         tree_item = QTreeWidgetItem(parent)
         tree_item.setText(0, item_name)
@@ -208,6 +251,7 @@ class Left_Menu_Tree(QTreeWidget):
             tree_item.setForeground(1, QColor('red'))
         tree_item.setFlags(tree_item.flags() | Qt.ItemIsUserCheckable)
         tree_item.setCheckState(0, Qt.Unchecked)
+        return tree_item
 
     def resize_columns_to_contents(self) -> None:
         self.resizeColumnToContents(0)
@@ -1,12 +1,17 @@
+import os
+from concurrent.futures import CancelledError
+from functools import partial
+
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QCheckBox, QComboBox, QDialogButtonBox,
                              QFileDialog, QFormLayout, QHBoxLayout, QLineEdit,
-                             QPushButton, QVBoxLayout)
+                             QProgressDialog, QPushButton, QVBoxLayout)
 
 import app.controller as ctrl
 import app.view as view
 
 from .base_widget import BaseWidget
+from .task_thread import TaskThread
 
 
 class OpenFileWindow(BaseWidget):
@@ -37,6 +42,7 @@ class OpenFileWindow(BaseWidget):
         self.filetype = filetype
         self.categories = categories
         self.settings = self.parent.settings
+        self.task_thread: TaskThread | None = None
         self.initUI()
 
     def initUI(self):
@@ -74,6 +80,8 @@ class OpenFileWindow(BaseWidget):
         else:
             self.load_unknown_check_box.hide()
         self.form_layout.addRow('Файл', self.init_browse_block())
+        if self.filetype == 'pdd':
+            self.form_layout.addRow('Время, с', self.init_interval_block())
         self.form_layout.addRow(self.load_unknown_check_box)
 
     def init_category_block(self) -> None:
@@ -93,6 +101,28 @@ class OpenFileWindow(BaseWidget):
         browse_button.clicked.connect(self.open_file_dialog)
         horizontal_layer.addWidget(self.filepath_line_edit)
         horizontal_layer.addWidget(browse_button)
+        if self.filetype == 'pdd':
+            # несколько файлов одного полёта открываются из папки
+            folder_button = QPushButton()
+            folder_button.setText('папка')
+            folder_button.setFixedSize(50, 22)
+            folder_button.clicked.connect(self.open_folder_dialog)
+            horizontal_layer.addWidget(folder_button)
+        horizontal_layer.setSpacing(15)
+        return horizontal_layer
+
+    def init_interval_block(self) -> QHBoxLayout:
+        '''
+        Необязательный интервал времени: при заданных границах из pdd
+        файла загружаются только записи интервала.
+        '''
+        horizontal_layer = QHBoxLayout()
+        self.start_line_edit = QLineEdit()
+        self.start_line_edit.setPlaceholderText('от')
+        self.stop_line_edit = QLineEdit()
+        self.stop_line_edit.setPlaceholderText('до')
+        horizontal_layer.addWidget(self.start_line_edit)
+        horizontal_layer.addWidget(self.stop_line_edit)
         horizontal_layer.setSpacing(15)
         return horizontal_layer
 
@@ -118,6 +148,16 @@ class OpenFileWindow(BaseWidget):
         self.adr_combo_box.addItems([adr['adr_name'] for adr in adrs])
 
     def open_file_dialog(self) -> None:
+        if self.filetype == 'pdd':
+            filePaths, check = QFileDialog.getOpenFileNames(
+                None,
+                'Open files',
+                '',
+                f'Open File (*.{self.filetype})'
+            )
+            if check and filePaths:
+                self.filepath_line_edit.setText('; '.join(filePaths))
+            return
         filePath, check = QFileDialog.getOpenFileName(
             None,
             'Open file',
@@ -127,23 +167,155 @@ class OpenFileWindow(BaseWidget):
         if check:
             self.filepath_line_edit.setText(filePath)
 
+    def open_folder_dialog(self) -> None:
+        dirpath = QFileDialog.getExistingDirectory(None, 'Open folder')
+        if dirpath:
+            self.filepath_line_edit.setText(dirpath)
+
+    def get_filepaths(self) -> list | str:
+        '''
+        Пути pdd файлов из строки ввода: путь папки, список файлов
+        через точку с запятой или один файл.
+        '''
+        text = self.filepath_line_edit.text().strip()
+        if os.path.isdir(text):
+            return text
+        filepaths = [path.strip() for path in text.split(';') if path.strip()]
+        return filepaths if len(filepaths) > 1 else text
+
     def open_file_txt(self) -> None:
+        '''
+        Чтение txt или csv файла в отдельном потоке с окном хода
+        чтения и возможностью отмены.
+        '''
         category = self.category_combo_box.currentText()
         adr = self.adr_combo_box.currentText()
         filepath = self.filepath_line_edit.text()
+        main_settings = self.settings.value('main_settings')
+        self.progress_dialog = QProgressDialog(
+            f'Чтение {os.path.basename(filepath)}...', 'Отмена', 0, 100, self
+        )
+        self.progress_dialog.setWindowModality(Qt.ApplicationModal)
+        self.progress_dialog.setMinimumDuration(0)
+        load_unknown = self.load_unknown_check_box.isChecked()
+        # в потоке файл только разбирается, данные контроллера меняются
+        # в потоке интерфейса
+        self.task_thread = TaskThread(partial(
+            self.controller.read_text,
+            filepath,
+            adr,
+            self.filetype,
+            self.categories[category],
+            load_unknown,
+            main_settings['text_workers']
+        ))
+        self.progress_dialog.canceled.connect(self.task_thread.cancel)
+        self.task_thread.progress_changed.connect(self.update_progress)
+        self.task_thread.done.connect(
+            lambda data: self.finish_file_txt(
+                filepath, category, adr, load_unknown, data
+            )
+        )
+        self.task_thread.failed.connect(self.fail_task)
+        self.openButton.setEnabled(False)
+        self.task_thread.start()
+
+    def update_progress(self, done: int, total: int) -> None:
+        if total:
+            self.progress_dialog.setValue(int(done * 100 / total))
+
+    def stop_task_thread(self) -> None:
+        '''Ожидание завершения потока чтения и закрытие окна хода.'''
+        if self.task_thread is not None:
+            self.task_thread.wait()
+            self.task_thread = None
+        self.progress_dialog.close()
+        self.openButton.setEnabled(True)
+
+    def finish_file_txt(
+        self,
+        filepath: str,
+        category: str,
+        adr: str,
+        load_unknown: bool,
+        data
+    ) -> None:
+        cancelled = self.task_thread is not None and (
+            self.task_thread.is_cancelled()
+        )
+        self.stop_task_thread()
+        if cancelled:
+            # отмена после разбора: данные не добавляются
+            self.parent.send_notify('предупреждение', 'Чтение файла отменено')
+            return
         try:
-            self.controller.load_text(
-                filepath,
-                category,
-                adr,
-                self.filetype,
-                self.categories[category],
-                self.load_unknown_check_box.isChecked()
+            self.controller.set_text_data(
+                filepath, category, adr, self.filetype,
+                self.categories[category], load_unknown, data
             )
+        except Exception as e:
+            self.parent.send_notify('ошибка', str(e))
+            return
+        self.parent.tree_widget.update_check_box()
+        self.parent.send_notify(
+            'успех', f'Файл {filepath} открыт'
+        )
+        self.parent.last_file_label.setText(
+            f'Последний открытый файл: {filepath}   '
+        )
+        self.parent.destroy_child_window()
+
+    def fail_task(self, error: Exception) -> None:
+        self.stop_task_thread()
+        if isinstance(error, CancelledError):
+            self.parent.send_notify('предупреждение', 'Чтение файла отменено')
+        else:
+            self.parent.send_notify('ошибка', str(error))
+
+    def closeEvent(self, event):
+        # поток чтения не должен пережить окно
+        if self.task_thread is not None:
+            self.task_thread.cancel()
+            self.task_thread.wait()
+            self.task_thread = None
+        super().closeEvent(event)
+
+    def open_file_pdd(self) -> None:
+        filepaths = self.get_filepaths()
+        if isinstance(filepaths, list) or os.path.isdir(filepaths):
+            self.open_files_pdd(filepaths)
+            return
+        category = self.category_combo_box.currentText()
+        json_data = self.categories[category]
+        filepath = self.filepath_line_edit.text()
+        main_settings = self.settings.value('main_settings')
+        start = self.start_line_edit.text().strip()
+        stop = self.stop_line_edit.text().strip()
+        report = None
+        try:
+            if start and stop:
+                self.controller.load_pdd_interval(
+                    filepath,
+                    category,
+                    json_data,
+                    float(start),
+                    float(stop)
+                )
+            else:
+                report = self.controller.load_pdd(
+                    filepath,
+                    category,
+                    json_data,
+                    main_settings['pdd_workers'],
+                    main_settings['pdd_cache_dir'],
+                    main_settings['pdd_cache_size']
+                )
             self.parent.tree_widget.update_check_box()
             self.parent.send_notify(
                 'успех', f'Файл {filepath} открыт'
             )
+            if report is not None:
+                self.show_pdd_report(filepath, report)
             self.parent.last_file_label.setText(
                 f'Последний открытый файл: {filepath}   '
             )
@@ -151,22 +323,119 @@ class OpenFileWindow(BaseWidget):
         except Exception as e:
             self.parent.send_notify('ошибка', str(e))
 
-    def open_file_pdd(self) -> None:
+    def show_pdd_report(self, filepath: str, report: dict) -> None:
+        '''
+        Вывод отчёта распаковки pdd файла и предупреждений о повреждениях
+        и разрывах счётчика времени.
+        '''
+        self.parent.send_notify(
+            'информация', self.controller.get_pdd_report_text(report)
+        )
+        if report['skipped']:
+            self.parent.send_notify(
+                'предупреждение',
+                f'Файл {filepath} повреждён, пропущено '
+                f'{report["skipped"]} байт'
+            )
+        if report['discontinuities']:
+            self.parent.send_notify(
+                'предупреждение',
+                'Разрывы счётчика времени: ' + ', '.join(
+                    f'{adr} - {count}'
+                    for adr, count in report['discontinuities'].items()
+                )
+            )
+
+    def open_files_pdd(self, filepaths: list | str) -> None:
+        '''
+        Открытие нескольких pdd файлов (или папки) одного полёта
+        в одну категорию в отдельном потоке с окном хода распаковки,
+        возможностью отмены между файлами и отчётом по файлам.
+        '''
         category = self.category_combo_box.currentText()
         json_data = self.categories[category]
-        filepath = self.filepath_line_edit.text()
+        main_settings = self.settings.value('main_settings')
+        self.progress_dialog = QProgressDialog(
+            'Распаковка pdd файлов...', 'Отмена', 0, 0, self
+        )
+        self.progress_dialog.setWindowModality(Qt.ApplicationModal)
+        self.progress_dialog.setMinimumDuration(0)
+        self.task_thread = TaskThread(
+            lambda progress, cancel: self.controller.read_pdd_batch(
+                filepaths,
+                json_data,
+                main_settings['pdd_workers'],
+                main_settings['pdd_cache_dir'],
+                main_settings['pdd_cache_size'],
+                lambda filepath, done, total: progress(done, total),
+                cancel
+            )
+        )
+        self.progress_dialog.canceled.connect(self.task_thread.cancel)
+        self.task_thread.progress_changed.connect(self.update_files_progress)
+        self.task_thread.done.connect(
+            lambda result: self.finish_files_pdd(
+                filepaths, category, json_data, *result
+            )
+        )
+        self.task_thread.failed.connect(self.fail_task)
+        self.openButton.setEnabled(False)
+        self.task_thread.start()
+
+    def update_files_progress(self, done: int, total: int) -> None:
+        self.progress_dialog.setMaximum(total)
+        self.progress_dialog.setLabelText(
+            f'Распаковано файлов: {done}/{total}'
+        )
+        self.progress_dialog.setValue(done)
+
+    def finish_files_pdd(
+        self,
+        filepaths: list | str,
+        category: str,
+        json_data: list,
+        tables: dict,
+        report: dict
+    ) -> None:
+        self.stop_task_thread()
         try:
-            self.controller.load_pdd(
-                filepath,
-                category,
-                json_data
+            self.controller.set_pdd_batch(
+                filepaths, category, json_data, tables
             )
             self.parent.tree_widget.update_check_box()
+            files = report['files']
             self.parent.send_notify(
-                'успех', f'Файл {filepath} открыт'
+                'успех',
+                f'Открыто файлов: {len(files)} за {report["seconds"]:.2f} с'
             )
+            self.parent.send_notify(
+                'информация',
+                '\n'.join(
+                    f'{os.path.basename(item["filepath"])} - '
+                    f'{item["records"]} записей, {item["seconds"]:.2f} с'
+                    + (
+                        f', не опознано {item["unmatched"]}'
+                        if item['unmatched'] else ''
+                    )
+                    for item in files
+                )
+            )
+            if report['skipped']:
+                self.parent.send_notify(
+                    'предупреждение',
+                    'Файлы повреждены, пропущено '
+                    f'{report["skipped"]} байт'
+                )
+            if report['discontinuities']:
+                self.parent.send_notify(
+                    'предупреждение',
+                    'Разрывы счётчика времени: ' + ', '.join(
+                        f'{adr} - {count}'
+                        for adr, count in report['discontinuities'].items()
+                    )
+                )
             self.parent.last_file_label.setText(
-                f'Последний открытый файл: {filepath}   '
+                f'Последний открытый файл: {files[-1]["filepath"]}   '
             )
             self.parent.destroy_child_window()
         except Exception as e:
@@ -2,7 +2,8 @@ from functools import partial
 
 from PyQt5.QtWidgets import (QCheckBox, QComboBox, QFileDialog, QFormLayout,
                              QHBoxLayout, QLineEdit, QMessageBox, QPushButton,
-                             QScrollArea, QTabWidget, QVBoxLayout, QWidget)
+                             QScrollArea, QSpinBox, QTabWidget, QVBoxLayout,
+                             QWidget)
 
 from .base_widget import BaseWidget
 from .settings_window_graph import GraphTab, ValueErrorGraph
@@ -97,6 +98,75 @@ class SettingsWindow(BaseWidget):
             'Открывать последний gzip:', self.openLastCheckbox
         )
 
+        self.pddWorkersSpinBox = QSpinBox()
+        self.pddWorkersSpinBox.setRange(1, 64)
+        self.pddWorkersSpinBox.setValue(
+            self.listMainSettings['pdd_workers']
+        )
+        tabLayout.addRow(
+            'Потоков распаковки pdd:', self.pddWorkersSpinBox
+        )
+
+        self.textWorkersSpinBox = QSpinBox()
+        self.textWorkersSpinBox.setRange(1, 64)
+        self.textWorkersSpinBox.setValue(
+            self.listMainSettings['text_workers']
+        )
+        tabLayout.addRow(
+            'Потоков чтения txt/csv:', self.textWorkersSpinBox
+        )
+
+        self.sessionCodecComboBox = QComboBox()
+        self.sessionCodecComboBox.addItems(['zlib', 'lzma', 'bz2'])
+        self.sessionCodecComboBox.setCurrentText(
+            self.listMainSettings['session_codec']
+        )
+        tabLayout.addRow(
+            'Сжатие gzip:', self.sessionCodecComboBox
+        )
+
+        self.sessionLevelSpinBox = QSpinBox()
+        self.sessionLevelSpinBox.setRange(0, 9)
+        self.sessionLevelSpinBox.setValue(
+            self.listMainSettings['session_level']
+        )
+        tabLayout.addRow(
+            'Уровень сжатия gzip:', self.sessionLevelSpinBox
+        )
+
+        self.sessionWorkersSpinBox = QSpinBox()
+        self.sessionWorkersSpinBox.setRange(1, 64)
+        self.sessionWorkersSpinBox.setValue(
+            self.listMainSettings['session_workers']
+        )
+        tabLayout.addRow(
+            'Потоков сжатия gzip:', self.sessionWorkersSpinBox
+        )
+
+        self.pddCacheDirLineEdit = QLineEdit(
+            self.listMainSettings['pdd_cache_dir']
+        )
+        tabLayout.addRow(
+            'Папка кэша pdd:', self.pddCacheDirLineEdit
+        )
+
+        self.pddCacheSizeSpinBox = QSpinBox()
+        self.pddCacheSizeSpinBox.setRange(0, 1024 * 1024)
+        self.pddCacheSizeSpinBox.setSuffix(' МБ')
+        self.pddCacheSizeSpinBox.setValue(
+            self.listMainSettings['pdd_cache_size']
+        )
+        tabLayout.addRow(
+            'Размер кэша pdd (0 - выкл.):', self.pddCacheSizeSpinBox
+        )
+
+        self.journalFileLineEdit = QLineEdit(
+            self.listMainSettings['journal_file']
+        )
+        tabLayout.addRow(
+            'Журнал изменений (пусто - выкл.):', self.journalFileLineEdit
+        )
+
         tabWidget.setLayout(tabLayout)
         return tabWidget
 
@@ -208,7 +278,15 @@ class SettingsWindow(BaseWidget):
             'theme': self.themeComboBox.currentText(),
             'json_dir': self.browseLineEdit.text(),
             'tool_bar': self.toolbarComboBox.currentText(),
-            'open_last_file': self.openLastCheckbox.isChecked()
+            'open_last_file': self.openLastCheckbox.isChecked(),
+            'pdd_workers': self.pddWorkersSpinBox.value(),
+            'text_workers': self.textWorkersSpinBox.value(),
+            'session_codec': self.sessionCodecComboBox.currentText(),
+            'session_level': self.sessionLevelSpinBox.value(),
+            'session_workers': self.sessionWorkersSpinBox.value(),
+            'pdd_cache_dir': self.pddCacheDirLineEdit.text(),
+            'pdd_cache_size': self.pddCacheSizeSpinBox.value(),
+            'journal_file': self.journalFileLineEdit.text()
         }
         if self.settings.value('main_settings') == newValueMainSettings:
             return False
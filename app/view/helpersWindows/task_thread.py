@@ -0,0 +1,37 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class TaskThread(QThread):
+    '''
+    Поток для долгой операции, чтобы не блокировать интерфейс.
+    task - функция, которой передаются функции progress(выполнено, всего)
+    и cancel(), возвращающая True после запроса отмены.
+    Ход выполнения передаётся сигналом progress_changed, результат -
+    сигналом done, исключение (в том числе отмена) - сигналом failed.
+    '''
+
+    progress_changed = pyqtSignal(object, object)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, task, parent=None) -> None:
+        super().__init__(parent)
+        self.task = task
+        self.cancelled = False
+
+    def run(self) -> None:
+        try:
+            result = self.task(
+                progress=self.progress_changed.emit,
+                cancel=self.is_cancelled
+            )
+        except Exception as e:
+            self.failed.emit(e)
+            return
+        self.done.emit(result)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled
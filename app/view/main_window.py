@@ -1,10 +1,12 @@
+import os
 import sys
 from functools import partial
 
 import pyqtgraph as pg
 from notificator import notificator
 from notificator.alingments import BottomRight
-from PyQt5.QtCore import QCoreApplication, QProcess, QSettings, Qt
+from PyQt5.QtCore import (QCoreApplication, QLockFile, QProcess, QSettings,
+                          Qt, QTimer)
 from PyQt5.QtGui import (QColor, QCursor, QIcon, QKeyEvent, QMovie, QPainter,
                          QPixmap)
 from PyQt5.QtWidgets import (QAction, QApplication, QFileDialog, QLabel,
@@ -14,11 +16,13 @@ from PyQt5.sip import delete
 
 import app.resource.qrc_resources
 from app.controller import (Control, NoneJsonError, default_settings,
-                            get_actions_list, get_menu_dict, get_palette,
-                            get_toolbar_list)
+                            get_actions_list, get_app_data_path,
+                            get_menu_dict, get_palette, get_toolbar_list,
+                            update_main_settings)
+from app.resource.constants import PDD_FOLLOW_INTERVAL
 from app.view.helpersWindows import (GraphOnTimeWidget, Left_Menu_Tree,
                                      OpenFileWindow, SaveCsvWindow,
-                                     SettingsWindow)
+                                     SettingsWindow, TaskThread)
 from app.view.services_windows import (CalcWindow, ConsoleWindow,
                                        FlightDataWindow, GraphWindow,
                                        MapWindow, ReportWindow)
@@ -43,6 +47,10 @@ class MainWindow(QMainWindow):
         self.open_file_window: OpenFileWindow | None = None
         self.graph_on_time_window: GraphOnTimeWidget | None = None
         self.flight_data_window: FlightDataWindow | None = None
+        # поток чтения файла сеанса прежнего формата
+        self.gzip_thread: TaskThread | None = None
+        # блокировка журнала изменений от других экземпляров программы
+        self.journal_lock: QLockFile | None = None
         self.controller: Control = Control()
         self.app_version = QCoreApplication.applicationVersion()
         self.app_name = QCoreApplication.applicationName()
@@ -51,12 +59,17 @@ class MainWindow(QMainWindow):
         if (self.settings.allKeys() == [] or
                 self.settings.value('version') != self.app_version):
             self.set_default_settings()
+        update_main_settings(self.settings)
         self.initUI()
         self.setTheme()
+        self.follow_timer = QTimer(self)
+        self.follow_timer.timeout.connect(self.update_follow_pdd)
 
+        # после аварийного завершения данные восстанавливаются из журнала
+        restored = self.open_journal()
         last_file = self.settings.value('last_file')
         open_last_file = self.settings.value('main_settings')['open_last_file']
-        if last_file is not None and open_last_file:
+        if not restored and last_file is not None and open_last_file:
             self.open_gzip_file(last_file['file_path'])
 
     def initUI(self) -> None:
@@ -217,8 +230,12 @@ class MainWindow(QMainWindow):
         obj.move(qr.topLeft())
 
     def clear_main_window(self) -> None:
+        self.follow_timer.stop()
+        self.follow_pdd_action.setChecked(False)
+        self.controller.close_journal()
         del self.controller
         self.controller = Control()
+        self.open_journal()
         self.tree_widget.clear()
         self.tree_widget.hide()
         self.mdi.closeAllSubWindows()
@@ -244,6 +261,10 @@ class MainWindow(QMainWindow):
         Метод открытия файлов в зависимостиот параметра.
         Открывает любые бинарные, которые могут использоваться
         в программе.
+        Файл сеанса открывается по каталогу (категории, АДР, столбцы,
+        число строк и размеры), поэтому дерево строится сразу, а столбцы
+        загружаются при обращении. Файл прежнего формата читается
+        в отдельном потоке.
         '''
         # TODO передалть на ласт файл на filepath открыть последний открытый
         if filepath:
@@ -255,29 +276,161 @@ class MainWindow(QMainWindow):
                 '',
                 f'Open File (*.gzip)'
             )
-        if check:
-            try:
-                self.controller.load_gzip(filepath)
-            except FileNotFoundError:
-                self.send_notify('ошибка', 'Файл не найден')
-            except TypeError as e:
-                self.send_notify('ошибка', str(e))
-            except Exception as e:
-                self.send_notify('ошибка', str(e))
-            else:
-                self.tree_widget.update_check_box()
-                self.settings.setValue(
-                    'last_file', {
-                        'file_path': filepath,
-                        'param': 'gzip'
-                    }
-                )
-                self.last_file_label.setText(
-                    f'Последний открытый файл: {filepath}   '
-                )
-                if not filepath:
-                    self.send_notify(
-                        'успех', f'Файл {filepath} открыт')
+        if not check:
+            return
+        if self.gzip_thread is not None:
+            self.send_notify('предупреждение', 'Файл ещё открывается')
+            return
+        workers = self.settings.value('main_settings')['session_workers']
+        try:
+            lazy = self.controller.is_lazy_gzip(filepath)
+        except FileNotFoundError:
+            self.send_notify('ошибка', 'Файл не найден')
+            return
+        except Exception as e:
+            self.send_notify('ошибка', str(e))
+            return
+        if not lazy:
+            # файл прежнего формата читается целиком в отдельном потоке,
+            # дерево появляется после чтения
+            self.gzip_thread = TaskThread(
+                lambda progress, cancel: self.controller.read_gzip(
+                    filepath, workers
+                ),
+                self
+            )
+            self.gzip_thread.done.connect(
+                lambda data: self.finish_gzip_file(filepath, data)
+            )
+            self.gzip_thread.failed.connect(self.fail_gzip_file)
+            self.statusbar.showMessage(f'Чтение {filepath}...')
+            self.gzip_thread.start()
+            return
+        # из файла сеанса читается только каталог: дерево строится сразу,
+        # столбцы загружаются при обращении
+        try:
+            data = self.controller.read_gzip(filepath, workers)
+        except Exception as e:
+            self.fail_gzip_file(e)
+            return
+        self.finish_gzip_file(filepath, data)
+
+    def finish_gzip_file(self, filepath: str, data: dict) -> None:
+        '''
+        Метод добавления данных открытого файла сеанса и построения дерева.
+        '''
+        self.stop_gzip_thread()
+        try:
+            self.controller.set_gzip_data(filepath, data)
+        except Exception as e:
+            self.send_notify('ошибка', str(e))
+            return
+        self.tree_widget.update_check_box()
+        self.settings.setValue(
+            'last_file', {
+                'file_path': filepath,
+                'param': 'gzip'
+            }
+        )
+        self.last_file_label.setText(
+            f'Последний открытый файл: {filepath}   '
+        )
+        if not filepath:
+            self.send_notify(
+                'успех', f'Файл {filepath} открыт')
+
+    def fail_gzip_file(self, error: Exception) -> None:
+        self.stop_gzip_thread()
+        if isinstance(error, FileNotFoundError):
+            self.send_notify('ошибка', 'Файл не найден')
+        else:
+            self.send_notify('ошибка', str(error))
+
+    def stop_gzip_thread(self) -> None:
+        '''Ожидание завершения потока чтения файла сеанса.'''
+        if self.gzip_thread is not None:
+            self.gzip_thread.wait()
+            self.gzip_thread = None
+            self.statusbar.clearMessage()
+
+    def open_journal(self) -> bool:
+        '''
+        Метод открытия журнала изменений данных.
+        Если прошлый запуск завершился без закрытия программы, данные
+        восстанавливаются из журнала.
+        Относительный путь журнала отсчитывается от папки данных
+        пользователя. Журнал открывается только одним экземпляром
+        программы, в остальных изменения не журналируются.
+        Возвращает True, если данные восстановлены.
+        '''
+        main_settings = self.settings.value('main_settings')
+        filepath = main_settings['journal_file']
+        if not filepath:
+            return False
+        filepath = get_app_data_path(filepath)
+        if not self.lock_journal(filepath):
+            self.send_notify(
+                'предупреждение',
+                'Журнал изменений занят другим экземпляром программы, '
+                'изменения не будут восстановлены после сбоя'
+            )
+            return False
+        try:
+            report = self.controller.open_journal(
+                filepath, main_settings['session_workers']
+            )
+        except Exception as e:
+            self.send_notify('ошибка', f'Журнал изменений не открыт: {e}')
+            return False
+        if not report['entries']:
+            return False
+        self.tree_widget.update_check_box()
+        if report['errors']:
+            self.send_notify(
+                'предупреждение',
+                'Не все изменения восстановлены:\n'
+                + '\n'.join(report['errors'])
+            )
+        else:
+            self.send_notify(
+                'успех', f'Восстановлено изменений: {report["entries"]}'
+            )
+        return True
+
+    def follow_pdd(self) -> None:
+        '''
+        Метод включения/выключения слежения за последним открытым pdd файлом.
+        '''
+        if not self.follow_pdd_action.isChecked():
+            self.follow_timer.stop()
+            return
+        if not self.controller.can_follow_pdd():
+            self.follow_pdd_action.setChecked(False)
+            self.send_notify(
+                'предупреждение', 'Сначала нужно открыть pdd файл'
+            )
+            return
+        self.follow_timer.start(PDD_FOLLOW_INTERVAL)
+
+    def update_follow_pdd(self) -> None:
+        '''
+        Метод опроса отслеживаемого pdd файла по таймеру.
+        Новые записи дописываются в данные, открытые графики обновляются.
+        '''
+        try:
+            counts = self.controller.update_pdd()
+        except Exception as e:
+            self.follow_timer.stop()
+            self.follow_pdd_action.setChecked(False)
+            self.send_notify('ошибка', str(e))
+            return
+        if not counts:
+            return
+        self.tree_widget.update_counts()
+        category = self.controller.follow_info['category']
+        for window in self.mdi.subWindowList():
+            if isinstance(window, GraphWindow):
+                window.update_curves(category, counts)
 
     def get_open_file_window(self, filetype: str) -> None:
         if self.open_file_window is None:
@@ -288,9 +441,9 @@ class MainWindow(QMainWindow):
                 self.open_file_window = OpenFileWindow(
                     'open_file_window', self.controller, filetype, categories, self
                 )
-            except KeyError:
+            except KeyError as e:
                 self.send_notify(
-                    'ошибка', 'Неверные данные в json файлах'
+                    'ошибка', f'Неверные данные в json файлах: {e}'
                 )
                 return
             except NoneJsonError:
@@ -359,7 +512,7 @@ class MainWindow(QMainWindow):
 
     def save_gzip_data(self) -> None:
         '''
-        Сохранение данных в формате pickle gzip 
+        Сохранение данных в файл сеанса (*.gzip)
         '''
         if not self.check_data():
             return
@@ -373,8 +526,14 @@ class MainWindow(QMainWindow):
             options=options
         )
         if file_path:
+            main_settings = self.settings.value('main_settings')
             try:
-                self.controller.save_gzip(file_path)
+                self.controller.save_gzip(
+                    file_path,
+                    main_settings['session_codec'],
+                    main_settings['session_level'],
+                    main_settings['session_workers']
+                )
             except PermissionError:
                 self.send_notify(
                     'ошибка', 'Файл открыт в другой программе или занят.')
@@ -665,6 +824,24 @@ class MainWindow(QMainWindow):
             for child in self.mdi.subWindowList():
                 child.findChild(pg.PlotWidget).setXLink(None)
 
+    def lock_journal(self, filepath: str) -> bool:
+        '''
+        Метод блокировки файла журнала на время работы программы.
+        Блокировка завершившегося с ошибкой экземпляра снимается.
+        '''
+        if self.journal_lock is not None:
+            return True
+        dirpath = os.path.dirname(filepath)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        lock = QLockFile(f'{filepath}.lock')
+        # блокировка устаревает только со смертью процесса
+        lock.setStaleLockTime(0)
+        if not lock.tryLock(0):
+            return False
+        self.journal_lock = lock
+        return True
+
     def close_all_windows(self) -> None:
         self.mdi.closeAllSubWindows()
         self.track_graph()
@@ -673,7 +850,13 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event) -> None:
         '''
         Переназначение функции закрытия, для закрытия всех дочерних окон.
+        При штатном закрытии журнал изменений удаляется.
         '''
+        self.stop_gzip_thread()
+        self.controller.close_journal()
+        if self.journal_lock is not None:
+            self.journal_lock.unlock()
+            self.journal_lock = None
         QApplication.closeAllWindows()
         event.accept()
 
@@ -219,28 +219,9 @@ class ConsoleWindow(QMainWindow):
             columnData: list
     ) -> None:
 
-        mainData = self.controller.get_data()
-
-        if category not in mainData:
-            newData = pandas.DataFrame(
-                {'time': timeData, columnName: columnData})
-            mainData[category] = {adr: newData}
-        elif adr not in mainData[category]:
-            newData = pandas.DataFrame(
-                {'time': timeData, columnName: columnData})
-            mainData[category][adr] = newData
-        else:
-            df: pandas.DataFrame = mainData[category][adr]
-            while True:
-                if columnName not in df.columns:
-                    break
-                columnName += '1'
-            newData = pandas.DataFrame(
-                {'time': timeData, columnName: columnData})
-            newData['time'] = newData['time'].astype(df.dtypes['time'])
-            df = df.merge(newData, on='time', how='outer')
-            self.controller.get_data()[category][adr] = df
-
+        columnName = self.controller.add_column(
+            category, adr, columnName, timeData, columnData
+        )
         self.parent.tree_widget.update_check_box()
         print(f'Столбец: {columnName} успешно добавлен в: {category}/{adr}')
 
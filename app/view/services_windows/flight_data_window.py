@@ -99,8 +99,7 @@ class FlightDataWindow(BaseWidget):
                         '_line_edit').setText(flight_data[correction_name])
 
     def save_event(self):
-        data: dict = self.parent.controller.get_data()
-        flight_data = data.get('FLIGHT_DATA', {})
+        flight_data = self.parent.controller.get_data().get('FLIGHT_DATA', {})
         flight_data['date'] = self.flight_date.date().toString('dd.MM.yyyy')
         flight_data['plane'] = self.plane_combo_box.currentText()
         flight_data['frw_version'] = self.frw_version_line_edit.text()
@@ -109,7 +108,7 @@ class FlightDataWindow(BaseWidget):
         for correction_name in self.correction_names:
             flight_data[correction_name] = getattr(
                 self, correction_name + '_line_edit').text()
-        data['FLIGHT_DATA'] = flight_data
+        self.parent.controller.set_flight_data(flight_data)
         self.parent.send_notify(
             'информация', 'Не забудьте сохранить данные в gzip'
         )
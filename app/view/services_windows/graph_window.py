@@ -11,6 +11,7 @@ from PyQt5.sip import delete
 import app.resource.qrc_resources
 import app.view as view
 from app.controller import get_intervals_from_string
+from app.model import LazyTable
 
 
 class GraphWindow(QMdiSubWindow):
@@ -95,16 +96,7 @@ class GraphWindow(QMdiSubWindow):
         self.plot.getAxis('left').setTextPen(pen)
 
         for category, adr, item in self.columns:
-            data_for_graph = self.data[category][adr].dropna(
-                subset=['time', item]
-            )
-            data_for_graph = data_for_graph.reset_index(
-            ).iloc[::self.decimation]
-            if self.start_time and self.stop_time:
-                data_for_graph = data_for_graph.loc[
-                    (data_for_graph['time'] >= self.start_time) & (
-                        data_for_graph['time'] <= self.stop_time)
-                ]
+            data_for_graph = self.get_data_for_graph(category, adr, item)
             pen = pg.mkPen(color=self.colors[0], width=1.5)
             curve = pg.PlotDataItem(
                 data_for_graph.time.to_list(),
@@ -139,6 +131,49 @@ class GraphWindow(QMdiSubWindow):
                 roi.setMovable(False)
                 self.plot.addItem(roi)
 
+    def get_data_for_graph(
+        self,
+        category: str,
+        adr: str,
+        item: str
+    ) -> pd.DataFrame:
+        '''
+        Метод подготовки данных кривой с учётом прореживания и
+        интервала времени.
+        '''
+        data = self.data[category][adr]
+        if self.start_time and self.stop_time and isinstance(data, LazyTable):
+            # распаковываются только строки интервала
+            data = data.between(self.start_time, self.stop_time)
+        data_for_graph = data.dropna(subset=['time', item])[['time', item]]
+        data_for_graph = data_for_graph.reset_index(
+        ).iloc[::self.decimation]
+        if self.start_time and self.stop_time:
+            data_for_graph = data_for_graph.loc[
+                (data_for_graph['time'] >= self.start_time) & (
+                    data_for_graph['time'] <= self.stop_time)
+            ]
+        return data_for_graph
+
+    def update_curves(self, category: str, adrs) -> None:
+        '''
+        Метод обновления кривых после дописывания данных (слежение за pdd).
+        Кривым выбранных адр передаются новые данные без перестроения окна.
+        '''
+        for curve_data in self.curves.values():
+            if curve_data['category'] != category:
+                continue
+            if curve_data['adr'] not in adrs:
+                continue
+            curve = curve_data['curve']
+            data_for_graph = self.get_data_for_graph(
+                category, curve_data['adr'], curve.name()
+            )
+            curve.setData(
+                data_for_graph.time.to_list(),
+                data_for_graph[curve.name()].to_list()
+            )
+
     def mouse_moved(self, e) -> None:
         '''
         Метод высплывающей подсказки по координатам при перемещении мыши.
@@ -327,7 +362,10 @@ class GraphWindow(QMdiSubWindow):
         category = curve_data['category']
         adr = curve_data['adr']
         item = curve.name()
-        data_for_graph = self.data[category][adr].iloc[::self.decimation]
+        data_for_graph = self.data[category][adr].dropna(
+            subset=['time', item]
+        )[['time', item]]
+        data_for_graph = data_for_graph.iloc[::self.decimation]
         x = [i + value for i in data_for_graph.time]
         y = data_for_graph[item]
         curve.setData(x, y)
@@ -336,9 +374,9 @@ class GraphWindow(QMdiSubWindow):
         '''
         Применить смещение
         '''
-        value = self.spin_box.value(),
-        data = self.data[curve_data['category']][curve_data['adr']]
-        data['time'] = data['time'] + value
+        self.parent.controller.shift_time(
+            curve_data['category'], curve_data['adr'], self.spin_box.value()
+        )
         self.parent.send_notify(
             'успех', 'Смещение задано. Не забудьте сохранить изменения'
         )
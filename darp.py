@@ -2,11 +2,13 @@ import sys
 import app.view as view
 from PyQt5.QtCore import QCoreApplication
 from PyQt5.QtWidgets import QApplication
+from app.controller import set_logging
 from app.resource.constants import (
     ORGANIZATION_DOMAIN,
     ORGANIZATION_NAME,
     APPLICATION_NAME,
-    APPLICATION_VERSION
+    APPLICATION_VERSION,
+    LOG_FILE
 )
 # TODO
 
@@ -17,6 +19,7 @@ def main() -> None:
     QCoreApplication.setOrganizationDomain(ORGANIZATION_DOMAIN)
     QCoreApplication.setApplicationName(APPLICATION_NAME)
     QCoreApplication.setApplicationVersion(APPLICATION_VERSION)
+    set_logging(LOG_FILE)
 
     app = QApplication(sys.argv)
     app.setStyle('Fusion')